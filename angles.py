@@ -0,0 +1,97 @@
+import math
+import numpy as np
+
+
+# bound once at import for the scalar angle calculation, which can run once per line in a loop
+_RAD2DEG = 180.0 / math.pi
+_atan2 = math.atan2
+
+
+def angles_from_directions(dx, dy):
+    """
+    Calculate the angle (bearing) of line direction vectors in degrees, accounting for bidirectional lines.
+    Works on single values or NumPy arrays.
+    :param dx: X component(s) of the direction(s) (last point minus first point).
+    :param dy: Y component(s) of the direction(s).
+    :return: Angle(s) in degrees (0-180), NaN where the first and last points coincide (no defined direction).
+    """
+    # Normalize the angle to the range 0-180 (to account for bidirectional lines) - % maps negative angles into the range too
+    angles = np.degrees(np.arctan2(dy, dx)) % 180.0
+    return np.where((dx == 0) & (dy == 0), np.nan, angles)
+
+
+def angle_from_direction(dx, dy):
+    """
+    Calculate the angle (bearing) of a single line direction vector in degrees, accounting for bidirectional lines.
+    Same result as angles_from_directions() but with plain math functions, which avoid NumPy's per-call overhead on single values.
+    :param dx: X component of the direction (last point minus first point).
+    :param dy: Y component of the direction.
+    :return: Angle in degrees (0-180), NaN if the first and last points coincide.
+    """
+    if dx == 0.0 and dy == 0.0:
+        return float("nan")
+    return (_atan2(dy, dx) * _RAD2DEG) % 180.0
+
+
+def is_parallel(angle1, angle2, tolerance=10):
+    """
+    Check if two angles are roughly parallel within a given tolerance.
+    :param angle1: Angle of the first line in degrees.
+    :param angle2: Angle of the second line in degrees.
+    :param tolerance: Tolerance in degrees for determining parallelism.
+    :return: True if angles are roughly parallel, False otherwise.
+    """
+    diff = abs(angle1 - angle2)
+    return diff <= tolerance
+
+
+def is_parallel_vec(dx1, dy1, dx2, dy2, tolerance=10):
+    """
+    Check if lines are roughly parallel within a given tolerance using their direction vectors rather than their angles.
+    Works on single values or NumPy arrays. Unlike comparing angles, lines on either side of 0/180 degrees (e.g. 2 and 179) are parallel.
+    :param dx1: X component of the direction of the first line.
+    :param dy1: Y component of the direction of the first line.
+    :param dx2: X component of the direction of the second line.
+    :param dy2: Y component of the direction of the second line.
+    :param tolerance: Tolerance in degrees for determining parallelism.
+    :return: True if lines are roughly parallel, False otherwise (also False if either line has no defined direction,
+        i.e. its first and last points coincide).
+    """
+    length1 = np.hypot(dx1, dy1)
+    length2 = np.hypot(dx2, dy2)
+    # the cross product of the two vectors is |v1| * |v2| * sin(angle between them) - no atan2 needed
+    return (np.abs(dx1 * dy2 - dy1 * dx2) <= np.sin(np.radians(tolerance)) * length1 * length2) & (length1 > 0) & (length2 > 0)
+
+
+def get_split_flags(xy, angle_threshold):
+    """
+    Flag the middle point of each three-point sequence along a line if the angle formed at that point is greater than the angle_threshold.
+    The bearings of all segments are calculated at once with NumPy rather than one three-point sequence at a time.
+    :param xy - list of tuples of float values: (X, Y) coordinates of the points of a single line, in order
+    :param angle_threshold - float: Threshold (in degrees) beyond which points will be used for splitting lines
+    :return - numpy array of bool values: One flag per three-point sequence (i.e. for the second through second-to-last points)
+    """
+    xy = np.asarray(xy, dtype=float)
+    # bearings in the range 0-180 (to account for bidirectional lines) - NaN for zero-length segments (repeated vertices),
+    # which are never flagged
+    bearings = angles_from_directions(np.diff(xy[:, 0]), np.diff(xy[:, 1]))
+    angles = np.abs(np.diff(bearings))
+    return (angles > angle_threshold) & (angles < 180 - angle_threshold)
+
+
+def get_split_flags_by_line(xy_by_line, angle_threshold):
+    """
+    Get the split flags (see get_split_flags()) of many lines at once. The coordinates of all lines are concatenated
+    so that the angles of every line are calculated in a single vectorized pass instead of one NumPy call per line.
+    :param xy_by_line - list of lists of tuples of float values: (X, Y) coordinates of the points of each line, in order
+    :param angle_threshold - float: Threshold (in degrees) beyond which points will be used for splitting lines
+    :return - list of numpy arrays of bool values: Flags for the second through second-to-last points of each line
+    """
+    if not xy_by_line:
+        return []
+    lengths = np.array([len(xy) for xy in xy_by_line])
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    flags = get_split_flags(np.concatenate([np.asarray(xy, dtype=float).reshape(-1, 2) for xy in xy_by_line]), angle_threshold)
+    # flag k belongs to the three-point sequence starting at point k, so the flags of a line with n points starting at
+    # offset o are flags[o:o + n - 2] (sequences that straddle two lines fall outside of every slice)
+    return [flags[offset:offset + max(length - 2, 0)] for offset, length in zip(offsets, lengths)]
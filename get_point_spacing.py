@@ -1,21 +1,18 @@
 import arcpy
 import os
-import json
-from shared import set_environment
+import numpy as np
+from shared import set_environment, drop_gdb_item_if_exists
 
 
 def add_fields(line_fc):
-    """Add fields for 'parcel_line_OID' (LONG) and 'point_spacing' (TEXT 3000 chars)"""
+    """Add a field for 'parcel_line_OID' (LONG)"""
     arcpy.AddField_management(line_fc, "parcel_line_OID", "LONG")
-    arcpy.AddField_management(line_fc, "point_spacing", "TEXT", field_length=3000)
 
 
 def populate_oid_field(line_fc):
     """Populates 'parcel_line_OID' with OBJECTID."""
-    with arcpy.da.UpdateCursor(line_fc, ["parcel_line_OID", "OBJECTID"]) as cursor:
-        for row in cursor:
-            row[0] = row[1]
-            cursor.updateRow(row)
+    # a plain field reference as in create_parcel_line_fc() - no need to round-trip every row through a cursor
+    arcpy.management.CalculateField(line_fc, "parcel_line_OID", "$feature.OBJECTID", "ARCADE")
 
 
 def convert_lines_to_points(line_fc, output_point_fc):
@@ -24,79 +21,82 @@ def convert_lines_to_points(line_fc, output_point_fc):
 
 
 def remove_duplicate_points(point_fc, unique_point_fc):
-    """Deletes points with duplicate geometries."""
-    arcpy.DeleteIdentical_management(point_fc, ["Shape"])
-    arcpy.CopyFeatures_management(point_fc, unique_point_fc)
-
-
-def calculate_point_spacing(unique_point_fc, line_fc):
-    """Calculates spacing between consecutive points and stores results in the line feature class."""
+    """
+    Writes points with unique geometries to a new feature class. Coordinates are snapped to a grid with cells the size of
+    the XY tolerance and the first point in each cell is kept. This only approximates DeleteIdentical: two points closer
+    than the tolerance are both kept if they fall in neighbouring cells.
+    """
+    # only parcel_line_OID is needed downstream - the line attributes carried over by FeatureVerticesToPoints are left behind
+    point_array = arcpy.da.FeatureClassToNumPyArray(point_fc, ["parcel_line_OID", "SHAPE@X", "SHAPE@Y"], null_value=-1)
+    spatial_reference = arcpy.Describe(point_fc).spatialReference
+    # snap coordinates to a grid of the XY tolerance so that most near-coincident vertices are dropped (rather than measured
+    # as ~0 ft spacings)
+    xy_tolerance = spatial_reference.XYTolerance or 0
+    xy = np.column_stack([point_array["SHAPE@X"], point_array["SHAPE@Y"]])
+    if xy_tolerance > 0:
+        xy = np.round(xy / xy_tolerance)
+    _, keep = np.unique(xy, axis=0, return_index=True)
+    # keep the original point order so OBJECTIDs in the new feature class still follow each line's vertex sequence
+    keep.sort()
+    drop_gdb_item_if_exists(unique_point_fc)
+    arcpy.da.NumPyArrayToFeatureClass(point_array[keep], unique_point_fc, ("SHAPE@X", "SHAPE@Y"), spatial_reference)
+
+
+def calculate_point_spacing(unique_point_fc, spacing_table):
+    """
+    Calculates spacing between consecutive points and stores results in a table with one row per point (other than the first
+    point of each line), ordered by line and then by point sequence.
+    :param unique_point_fc: Point feature class (output of remove_duplicate_points()) with a parcel_line_OID field.
+    :param spacing_table: Output table with parcel_line_OID, seq, point_oid and spacing_ft fields.
+    """
     
-    # Dictionary to store spacing information for each line
-    line_spacing = {}
-
-    # Read points, grouped by parcel_line_OID, sorted by sequence
-    with arcpy.da.SearchCursor(unique_point_fc, ["parcel_line_OID", "OBJECTID", "SHAPE@"], sql_clause=(None, "ORDER BY parcel_line_OID, OBJECTID")) as cursor:
-        current_line_id = None
-        previous_point = None
-        spacing_dict = {}
-
-        for row in cursor:
-            if row[0] != current_line_id:
-                # Store previous line's spacing info
-                if current_line_id is not None:
-                    line_spacing[current_line_id] = json.dumps(spacing_dict)
-
-                # Reset for new line
-                current_line_id = row[0]
-                previous_point = None
-                spacing_dict = {}
-
-            if previous_point is not None:
-                # Calculate distance between current and previous point (feet)
-                #dist = ((row[2][0] - previous_point[0]) ** 2 + (row[2][1] - previous_point[1]) ** 2) ** 0.5 * 3.28084  # Convert meters to feet
-                dist = ((row[2].centroid.X - previous_point[0]) ** 2 + (row[2].centroid.Y - previous_point[1]) ** 2) ** 0.5
-                spacing_dict[row[1]] = round(dist, 2)
-
-            #previous_point = row[2]
-            previous_point = (row[2].centroid.X, row[2].centroid.Y)
-        
-        # Store last line's spacing info
-        if current_line_id is not None:
-            line_spacing[current_line_id] = json.dumps(spacing_dict)
-
-    # Write spacing dictionary to 'point_spacing' in the line feature class
-    with arcpy.da.UpdateCursor(line_fc, ["parcel_line_OID", "point_spacing"]) as cursor:
-        for row in cursor:
-            row[1] = line_spacing.get(row[0], "{}")
-            cursor.updateRow(row)
-
-
-def get_curved_lines(line_fc,  distance_threshold=4, point_count_threshold=5):
+    # Read all points at once (coordinates only) and sort them by parcel_line_OID, then by sequence
+    point_array = arcpy.da.TableToNumPyArray(unique_point_fc, ["parcel_line_OID", "OBJECTID", "SHAPE@X", "SHAPE@Y"], null_value=-1)
+    point_array = point_array[np.lexsort((point_array["OBJECTID"], point_array["parcel_line_OID"]))]
+
+    # Distance between each point and the next (feet) - distances between the last point of one line and the first point
+    # of the next are calculated too but dropped below
+    distances = np.hypot(np.diff(point_array["SHAPE@X"]), np.diff(point_array["SHAPE@Y"]))
+    # the first point of each line has no previous point on the same line
+    same_line = point_array["parcel_line_OID"][1:] == point_array["parcel_line_OID"][:-1]
+    line_oids = point_array["parcel_line_OID"][1:][same_line]
+    _, line_starts = np.unique(line_oids, return_index=True)
+
+    spacing_array = np.empty(len(line_oids), dtype=[("parcel_line_OID", "i4"), ("seq", "i4"), ("point_oid", "i4"), ("spacing_ft", "f8")])
+    spacing_array["parcel_line_OID"] = line_oids
+    # position of each point along its line, starting at 1 for the second point
+    spacing_array["seq"] = np.arange(len(line_oids)) - np.repeat(line_starts, np.diff(np.append(line_starts, len(line_oids)))) + 1
+    spacing_array["point_oid"] = point_array["OBJECTID"][1:][same_line]
+    spacing_array["spacing_ft"] = np.round(distances[same_line], 2)
+
+    # Write all spacings to the table at once
+    drop_gdb_item_if_exists(spacing_table)
+    arcpy.da.NumPyArrayToTable(spacing_array, spacing_table)
+
+
+def get_curved_lines(line_fc, spacing_table, distance_threshold=4, point_count_threshold=5):
     """
     Selects curved lines from the input feature class based on number of consecutive points separated by a distance less than a given threshold.
-    :param line_fc: Input feature class containing lines and a poit_spacing field (added in calculate_point_spacing()).
+    :param line_fc: Input feature class containing lines and a parcel_line_OID field.
+    :param spacing_table: Table of point spacings by parcel_line_OID (created in calculate_point_spacing()).
     :param distance_threshold: Maximum distance (in feet) between consecutive points for identification of a curve.
     :param point_count_threshold: Minimum number of consecutive points under the distance_threshold for identification of a curve.
     """
-    curved_oids = []
-    with arcpy.da.SearchCursor(line_fc, ["OBJECTID", "point_spacing"]) as cursor:
-        for row in cursor:
-            # TODO need for json.loads() here?
-            point_spacing = json.loads(row[1])
-            consecutive_points = 0
-            for oid, spacing in point_spacing.items():
-                if spacing < distance_threshold:
-                    consecutive_points += 1
-                    if consecutive_points >= point_count_threshold:
-                        curved_oids.append(row[0])
-                        break
-                else:
-                    consecutive_points = 0
+    spacing_array = arcpy.da.TableToNumPyArray(spacing_table, ["parcel_line_OID", "seq", "spacing_ft"])
+    spacing_array = spacing_array[np.lexsort((spacing_array["seq"], spacing_array["parcel_line_OID"]))]
+    line_oids = spacing_array["parcel_line_OID"]
+    is_short = spacing_array["spacing_ft"] < distance_threshold
+    # a run of short spacings ends at a longer spacing or at the start of a new line
+    run_breaks = ~is_short
+    run_breaks[1:] |= line_oids[1:] != line_oids[:-1]
+    run_ids = np.cumsum(run_breaks)
+    # number of short spacings in the run that each short spacing belongs to
+    run_lengths = np.bincount(run_ids[is_short])[run_ids[is_short]]
+    curved_oids = np.unique(line_oids[is_short][run_lengths >= point_count_threshold]).tolist()
     #arcpy.selectlayerbyattribute(line_fc, "OBJECTID", "IN", curved_oids)
     #arcpy.management.SelectLayerByAttribute(line_fc, "NEW_SELECTION", f"OBJECTID IN {','.join(map(str, curved_oids))}")
     curved_lines = "curved_lines_layer"
-    arcpy.management.MakeFeatureLayer(line_fc, curved_lines, f"OBJECTID IN ({','.join(map(str, curved_oids))})")
+    arcpy.management.MakeFeatureLayer(line_fc, curved_lines, f"parcel_line_OID IN ({','.join(map(str, curved_oids))})")
     curved_lines_fc = os.path.join(workspace, f"curved_lines_using_{point_count_threshold}_consecutive_pts_with_{distance_threshold}_ft_spacing")
     arcpy.CopyFeatures_management(curved_lines, curved_lines_fc)
 
@@ -110,12 +110,13 @@ def main(line_fc, workspace):
     # Define intermediate datasets
     point_fc = os.path.join(workspace, "line_vertices_points_20250204")
     unique_point_fc = os.path.join(workspace, "unique_line_vertices_20250204")
+    spacing_table = os.path.join(workspace, "parcel_line_spacings_20250204")
     add_fields(line_fc)
     populate_oid_field(line_fc)
     convert_lines_to_points(line_fc, point_fc)
     remove_duplicate_points(point_fc, unique_point_fc)
-    calculate_point_spacing(unique_point_fc, line_fc)
-    get_curved_lines(line_fc, distance_threshold=5, point_count_threshold=5)
+    calculate_point_spacing(unique_point_fc, spacing_table)
+    get_curved_lines(line_fc, spacing_table, distance_threshold=5, point_count_threshold=5)
     print("Processing completed successfully.")
 
 # Example usage:
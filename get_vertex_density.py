@@ -5,10 +5,7 @@ from shared import set_environment
 def add_oid_field(line_fc, oid_field="parcel_line_OID"):
     """Adds and populates a field with the ObjectID."""
     arcpy.AddField_management(line_fc, oid_field, "LONG")
-    with arcpy.da.UpdateCursor(line_fc, [oid_field, "OID@"]) as cursor:
-        for row in cursor:
-            row[0] = row[1]
-            cursor.updateRow(row)
+    arcpy.management.CalculateField(line_fc, oid_field, "$feature.OBJECTID", "ARCADE")
 
 def convert_lines_to_points(line_fc, output_point_fc):
     """Runs 'Feature Vertices to Points' to generate points at line vertices."""
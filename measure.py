@@ -3,7 +3,8 @@ import arcpy
 import time
 import pandas as pd
 import numpy as np
-from shared import set_environment
+from shared import set_environment, debug_enabled, drop_field_if_exists, add_fields_if_not_exist, drop_gdb_item_if_exists, drop_gdb_items_if_exist
+from near_tables import build_side_info_array
 
 
 def clear_existing_outputs(output_items):
@@ -11,9 +12,7 @@ def clear_existing_outputs(output_items):
     Delete existing outputs if they already exist.
     :param output_items - list: List of output items to delete if they exist.
     """
-    for item in output_items:
-        if arcpy.Exists(item):
-            arcpy.management.Delete(item)
+    drop_gdb_items_if_exist(output_items)
 
 
 
@@ -80,54 +79,39 @@ def calculate_nearest_distances(building_lines_fc, parcel_lines_fc, near_table_p
     print("Nearest distances calculated.")
 
 
-def simplify_near_table(gdb_path, near_table_name, max_rank=6):
-    """
-    Simplify the near table by filtering out records with NEAR_RANK greater than max_rank.
-    :param gdb_path - string: Path to the geodatabase.
-    :param near_table_name - string: Name of the near table.
-    :param max_rank - int: Maximum 'near rank' to retain in the table. (NEAR_RANK value of 1 is closest parcel boundary to a building side)
-    :return out_table_path - string: Path of the simplified near table.
-    """
-    print("Simplifying near table...")
-    out_table_name = f"{near_table_name}_max_rank_{max_rank}_or_less"
-    out_table_path = os.path.join(gdb_path, out_table_name)
-    near_table_path = os.path.join(gdb_path, near_table_name)
-    arcpy.analysis.TableSelect(near_table_path, out_table_path, f"NEAR_RANK <= {max_rank}")
-    print(f"Number of records with NEAR_RANK <= {max_rank}: {arcpy.GetCount_management(out_table_path).getOutput(0)}.")
-    print(f"Near table simplified to records with NEAR_RANK <= {max_rank}.")
-    return out_table_path
-
-
-def transform_near_table(gdb_path, near_table_name):
+def transform_near_table(gdb_path, near_table_name, max_rank=None):
     """
     Transform the near table to a format that can be joined with the input building layer.
     :param gdb_path - string: Path to the geodatabase.
     :param near_table_name - string: Name of the near table to transform.
+    :param max_rank - int: Maximum 'near rank' to retain (optional). (NEAR_RANK value of 1 is closest parcel boundary to a building side)
     :return transformed_table_path - string: Path of the transformed near table.
     """
     print("Transforming near table...")
     near_table_path = os.path.join(gdb_path, near_table_name)
-    table_array = arcpy.da.TableToNumPyArray(near_table_path, "*")
-    df = pd.DataFrame(table_array)
-
-    output_data = []
-    for in_fid in df['IN_FID'].unique():
-        subset = df[df['IN_FID'] == in_fid]
-        row = {'IN_FID': in_fid}
-    
-        for _, item in subset.iterrows():
-            rank = int(item['NEAR_RANK'])
-            row[f'PB_{rank}_FID'] = item['NEAR_FID']
-            row[f'PB_{rank}_DIST_FT'] = item['NEAR_DIST']
-    
-        output_data.append(row)
-
-    transformed_df = pd.DataFrame(output_data)
-    transformed_df.fillna(-1, inplace=True)
-    out_table_array = np.array([tuple(row) for row in transformed_df.to_records(index=False)], 
-                               dtype=[(name, 'f8' if 'DIST' in name else 'i4') for name in transformed_df.columns])
+    where_clause = f"NEAR_RANK <= {max_rank}" if max_rank is not None else None
+    table_array = arcpy.da.TableToNumPyArray(near_table_path, ["IN_FID", "NEAR_FID", "NEAR_DIST", "NEAR_RANK"],
+                                             where_clause=where_clause)
+
+    # one output row per IN_FID, one FID/distance column pair per NEAR_RANK
+    in_fids, row_idx = np.unique(table_array['IN_FID'], return_inverse=True)
+    ranks, rank_idx = np.unique(table_array['NEAR_RANK'], return_inverse=True)
+    dtype = [('IN_FID', 'i4')]
+    for rank in ranks:
+        dtype += [(f'PB_{int(rank)}_FID', 'i4'), (f'PB_{int(rank)}_DIST_FT', 'f8')]
+    out_table_array = np.empty(len(in_fids), dtype=dtype)
+    out_table_array['IN_FID'] = in_fids
+    for i, rank in enumerate(ranks):
+        mask = rank_idx == i
+        fid_col = np.full(len(in_fids), -1, dtype='i4')
+        dist_col = np.full(len(in_fids), -1.0)
+        fid_col[row_idx[mask]] = table_array['NEAR_FID'][mask]
+        dist_col[row_idx[mask]] = table_array['NEAR_DIST'][mask]
+        out_table_array[f'PB_{int(rank)}_FID'] = fid_col
+        out_table_array[f'PB_{int(rank)}_DIST_FT'] = dist_col
 
     transformed_table_path = os.path.join(gdb_path, "transformed_near_table")
+    drop_gdb_item_if_exists(transformed_table_path)
     arcpy.da.NumPyArrayToTable(out_table_array, transformed_table_path)
     #print(f"Transformed near table has been written to {transformed_table_path}")
     return transformed_table_path
@@ -150,14 +134,9 @@ def modify_out_table_fields(out_layer_path):
     :param out_layer_path - string: Path to output layer (building feature class containing near distances).
     """
     print("Modifying near table fields...")
-    fields = arcpy.ListFields(out_layer_path)
-    to_delete = ["LEFT_FID", "RIGHT_FID"]
-    for field in fields:    
-        if field.name in to_delete:
-            arcpy.management.DeleteField(out_layer_path, field.name)
+    drop_field_if_exists(out_layer_path, ["LEFT_FID", "RIGHT_FID"])
     new_fields = [("HEIGHT_FT", "FLOAT"), ("AREA_FT", "FLOAT"), ("CONDITION", "TEXT")]
-    for field in new_fields:
-        arcpy.management.AddField(out_layer_path, field[0], field[1])
+    add_fields_if_not_exist(out_layer_path, new_fields)
     print("Fields of output table modified.")    
 
 
@@ -187,8 +166,7 @@ def run():
     arcpy.management.DeleteIdentical(parcel_lines, "Shape")
     calculate_nearest_distances(building_lines, parcel_lines, near_table_path)
 
-    simplified_near_table_path = simplify_near_table(gdb_path, near_table_name, max_rank=8)
-    transformed_near_table_path = transform_near_table(gdb_path, simplified_near_table_path)
+    transformed_near_table_path = transform_near_table(gdb_path, near_table_name, max_rank=8)
 
     join_near_distances(building_lines, transformed_near_table_path)
     modify_out_table_fields(building_lines)
@@ -209,8 +187,7 @@ def transform_near_table_with_street_info(gdb_path, near_table_name, street_fc,
 
     # Step 1: Pre-compute spatial relationships between parcel lines and streets
     street_parcel_join = os.path.join(gdb_path, "street_parcel_join")
-    if arcpy.Exists(street_parcel_join):
-        arcpy.management.Delete(street_parcel_join)
+    drop_gdb_item_if_exists(street_parcel_join)
     
     print("Performing spatial join between parcel lines and streets...")
     #TODO: # Use a search radius that is appropriate for the data
@@ -224,49 +201,30 @@ def transform_near_table_with_street_info(gdb_path, near_table_name, street_fc,
 
     # Step 2: Load the near table into a pandas DataFrame
     near_table_path = os.path.join(gdb_path, near_table_name)
-    near_array = arcpy.da.TableToNumPyArray(near_table_path, "*")
+    # only the fields used below - not every field in the near table
+    near_array = arcpy.da.TableToNumPyArray(near_table_path, ["IN_FID", "NEAR_FID", "NEAR_DIST"])
     near_df = pd.DataFrame(near_array)
 
-    # Merge the near table with the spatial join results to identify adjacent streets
-    merged_df = near_df.merge(join_df, left_on="NEAR_FID", right_on="PB_FID", how="left")
+    # Look up the street name of each near feature to identify adjacent streets - the spatial join is one-to-one, so
+    # PB_FID is unique and a lookup (map) is enough rather than a merge
+    merged_df = near_df
+    merged_df["STREET_NAME"] = merged_df["NEAR_FID"].map(join_df.set_index("PB_FID")["STREET_NAME"])
     merged_df["is_facing_street"] = merged_df["STREET_NAME"].notna()
 
     # Step 3: Populate fields for adjacent streets and other sides
-    output_data = []
-    for in_fid, group in merged_df.groupby("IN_FID"):
-        row = {"IN_FID": in_fid}
-        facing_count, other_count = 1, 1
-
-        for _, record in group.iterrows():
-            near_fid = record["NEAR_FID"]
-            distance = record["NEAR_DIST"]
-
-            if record["is_facing_street"]:
-                if facing_count <= 4:  # Limit to 4 adjacent streets
-                    row[f"FACING_STREET_{facing_count}"] = record["STREET_NAME"]
-                    row[f"FACING_STREET_{facing_count}_PB_FID"] = near_fid
-                    row[f"FACING_STREET_{facing_count}_DIST_FT"] = distance
-                    facing_count += 1
-            else:
-                if other_count <= 4:  # Limit to 4 other sides
-                    row[f"OTHER_SIDE_{other_count}_PB_FID"] = near_fid
-                    row[f"OTHER_SIDE_{other_count}_DIST_FT"] = distance
-                    other_count += 1
-
-        output_data.append(row)
-
-    # Step 4: Convert output to a NumPy structured array and write to a table
-    output_df = pd.DataFrame(output_data)
-    print(output_df.head())
-    output_df.fillna(-1, inplace=True)
-    output_fields = [(col, "f8" if "DIST" in col else ("i4" if output_df[col].dtype.kind in 'i' else "<U50")) for col in output_df.columns]
-    print(f'Output fields: {output_fields}')
-    output_array = np.array([tuple(row) for row in output_df.to_records(index=False)], dtype=output_fields)
+    # take the records of each building side in order of distance (separately for facing streets and other sides)
+    merged_df = merged_df.sort_values(["IN_FID", "NEAR_DIST"], kind="mergesort")
+
+    # Step 4: Fill a NumPy structured array directly (limit to 4 adjacent streets and 4 other sides) and write to a table
+    street_name_length = arcpy.ListFields(street_parcel_join, "StFULLName")[0].length
+    output_array = build_side_info_array(merged_df, max_count=4, street_name_length=street_name_length)
+    if debug_enabled():
+        print(output_array[:5])
+        print(f'Output fields: {output_array.dtype.descr}')
 
     #transformed_table_path = os.path.join(gdb_path, "transformed_near_table_with_facing_optimized")
     transformed_table_path = os.path.join(gdb_path, "transformed_near_table_with_street_info")
-    if arcpy.Exists(transformed_table_path):
-        arcpy.management.Delete(transformed_table_path)
+    drop_gdb_item_if_exists(transformed_table_path)
 
     arcpy.da.NumPyArrayToTable(output_array, transformed_table_path)
     print(f"Transformed near table written to: {transformed_table_path}")
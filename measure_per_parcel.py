@@ -1,41 +1,49 @@
 import os
-import math
 import arcpy
 import time
 import pandas as pd
 import numpy as np
-from shared import set_environment
+from shared import set_environment, debug_enabled, drop_gdb_item_if_exists
+from near_tables import build_side_info_array
+from angles import angles_from_directions, angle_from_direction, is_parallel_vec
 
 
 def calculate_angle(geometry):
     """
     Calculate the angle (bearing) between first and last points of a line geometry in degrees, accounting for bidirectional lines.
+    Kept for single geometries - use calculate_angles_bulk() to get the angles of all lines in a feature class.
     :param geometry: The geometry object of the line.
-    :return: Angle in degrees (0-360).
+    :return: Angle in degrees (0-180), or NaN for closed or zero-length lines.
     """
     start = geometry.firstPoint
     end = geometry.lastPoint
-    dx = end.X - start.X
-    dy = end.Y - start.Y
-    angle = math.degrees(math.atan2(dy, dx))
-    # Normalize to 0-360 degrees
-    angle = angle % 360
-    # Normalize the angle to the range 0-180 (to account for bidirectional lines)
-    if angle > 180:
-        angle -= 180
-    return angle
-
-
-def is_parallel(angle1, angle2, tolerance=10):
+    return angle_from_direction(end.X - start.X, end.Y - start.Y)
+
+
+def get_line_directions_bulk(line_fc):
+    """
+    Get the direction vector (from first to last point) of every line in a feature class at once.
+    :param line_fc: Path to the line feature class.
+    :return: Tuple of NumPy arrays (OBJECTIDs, x components, y components), one element per line.
+    """
+    # one row per vertex - the vertices of each line are returned together and in order
+    vertex_array = arcpy.da.FeatureClassToNumPyArray(line_fc, ["OID@", "SHAPE@X", "SHAPE@Y"], explode_to_points=True)
+    oids = vertex_array["OID@"]
+    first_indices = np.flatnonzero(np.r_[True, oids[1:] != oids[:-1]])
+    last_indices = np.r_[first_indices[1:], len(oids)] - 1
+    dx = vertex_array["SHAPE@X"][last_indices] - vertex_array["SHAPE@X"][first_indices]
+    dy = vertex_array["SHAPE@Y"][last_indices] - vertex_array["SHAPE@Y"][first_indices]
+    return oids[first_indices], dx, dy
+
+
+def calculate_angles_bulk(line_fc):
     """
-    Check if two angles are roughly parallel within a given tolerance.
-    :param angle1: Angle of the first line in degrees.
-    :param angle2: Angle of the second line in degrees.
-    :param tolerance: Tolerance in degrees for determining parallelism.
-    :return: True if angles are roughly parallel, False otherwise.
+    Calculate the angle (bearing) between first and last points of every line in a feature class at once, as in calculate_angle().
+    :param line_fc: Path to the line feature class.
+    :return: Dictionary of angles in degrees (0-180) keyed by OBJECTID.
     """
-    diff = abs(angle1 - angle2)
-    return diff <= tolerance
+    oids, dx, dy = get_line_directions_bulk(line_fc)
+    return dict(zip(oids.tolist(), angles_from_directions(dx, dy).tolist()))
 
 
 def clip_streets_near_parcel(parcel_fc, parcel_id, street_fc, output_street_fc, buffer_ft=40):
@@ -54,14 +62,13 @@ def clip_streets_near_parcel(parcel_fc, parcel_id, street_fc, output_street_fc,
     arcpy.management.MakeFeatureLayer(parcel_fc, parcel_layer, f"OBJECTID = {parcel_id}")
     
     # TODO - ask for permission to delete output feature class?
+    # the buffer is only needed for the clip below, so it is kept in memory rather than written to the geodatabase
+    parcel_buffer = r"memory\parcel_buffer"
     arcpy.management.Delete(output_street_fc)
-    arcpy.management.Delete("parcel_buffer")
+    arcpy.management.Delete(parcel_buffer)
     print("output_street_fc and parcel_buffer deleted")
     #arcpy.management.SelectLayerByAttribute(parcel_fc, "NEW_SELECTION", f"OBJECTID = {parcel_id}")
 
-    parcel_buffer = "parcel_buffer"
-
-    # TODO - create buffer in memory or delete when finished
     arcpy.analysis.Buffer(
     in_features=parcel_layer,
     out_feature_class=parcel_buffer,
@@ -79,6 +86,7 @@ def clip_streets_near_parcel(parcel_fc, parcel_id, street_fc, output_street_fc,
 
     # Clip streets near the parcel - returns almost all streets (but because the buffer created was too large - may be able to return to this)
     arcpy.analysis.Clip(street_fc, parcel_buffer, output_street_fc)
+    arcpy.management.Delete(parcel_buffer)
 
 
     # TODO - find faster solution for this?
@@ -107,67 +115,70 @@ def populate_parallel_field(parcel_street_join_fc, parcel_line_fc, street_name_f
 
     #Pre-compute spatial relationships between parcel lines and streets
     #parcel_street_join = os.path.join(gdb_path, "parcel_street_join")
-    if arcpy.Exists(parcel_street_join_fc):
-        arcpy.management.Delete(parcel_street_join_fc)
+    drop_gdb_item_if_exists(parcel_street_join_fc)
 
     print("Performing spatial join between parcel lines and streets...")
 
     #TODO: # Use a search radius that is appropriate for the data
     # value of join_type may not matter when join_operation is JOIN_ONE_TO_MANY
-    # field mapping came from Pro to preserve shared_boundary and parcel_polygon_OID fields - may need to adjust
+    # keep only the fields read later (parcel_polygon_OID, shared_boundary and the street name) rather than carrying every
+    # parcel and street attribute through the join
+    field_mappings = arcpy.FieldMappings()
+    for source_fc, field_name in [(parcel_line_fc, "parcel_polygon_OID"), (parcel_line_fc, "shared_boundary"), (street_fc, street_name_field)]:
+        field_map = arcpy.FieldMap()
+        field_map.addInputField(source_fc, field_name)
+        field_mappings.addFieldMap(field_map)
     arcpy.analysis.SpatialJoin(parcel_line_fc, street_fc, parcel_street_join_fc, join_operation="JOIN_ONE_TO_MANY", join_type="KEEP_COMMON", 
-        match_option="WITHIN_A_DISTANCE", search_radius="50 Feet", field_mapping='FID_parcels_in_zones_r_th_otmu_li_ao "FID_parcels_in_zones_r_th_otmu_li_ao" true true false 4 Long 0 0,First,#,parcel_lines_from_polygons_TEST,FID_parcels_in_zones_r_th_otmu_li_ao,-1,-1;PROP_TYPE "Property Type" true true false 5 Text 0 0,First,#,parcel_lines_from_polygons_TEST,PROP_TYPE,0,4;prop_id "Property ID" true true false 4 Long 0 0,First,#,parcel_lines_from_polygons_TEST,prop_id,-1,-1;RNUMBER "RNUMBER" true true false 20 Text 0 0,First,#,parcel_lines_from_polygons_TEST,RNUMBER,0,19;ABST_SUBD_NUM "Abstract Subdivision Number" true true false 254 Text 0 0,First,#,parcel_lines_from_polygons_TEST,ABST_SUBD_NUM,0,253;ABST_SUBD_NAME "Abstract Subdivision Name" true true false 254 Text 0 0,First,#,parcel_lines_from_polygons_TEST,ABST_SUBD_NAME,0,253;OWNER "OWNER" true true false 70 Text 0 0,First,#,parcel_lines_from_polygons_TEST,OWNER,0,69;ADDR1 "ADDR1" true true false 60 Text 0 0,First,#,parcel_lines_from_polygons_TEST,ADDR1,0,59;ADDR2 "ADDR2" true true false 60 Text 0 0,First,#,parcel_lines_from_polygons_TEST,ADDR2,0,59;ADDR3 "ADDR3" true true false 60 Text 0 0,First,#,parcel_lines_from_polygons_TEST,ADDR3,0,59;CITY "CITY" true true false 50 Text 0 0,First,#,parcel_lines_from_polygons_TEST,CITY,0,49;STATE "STATE" true true false 50 Text 0 0,First,#,parcel_lines_from_polygons_TEST,STATE,0,49;ZIP "ZIP" true true false 20 Text 0 0,First,#,parcel_lines_from_polygons_TEST,ZIP,0,19;SITUS "Address" true true false 150 Text 0 0,First,#,parcel_lines_from_polygons_TEST,SITUS,0,149;SITUS_NUM "Address Number" true true false 50 Text 0 0,First,#,parcel_lines_from_polygons_TEST,SITUS_NUM,0,49;SITUS_STREET "Street" true true false 140 Text 0 0,First,#,parcel_lines_from_polygons_TEST,SITUS_STREET,0,139;SITUS_PREDIR "Street Predirection" true true false 20 Text 0 0,First,#,parcel_lines_from_polygons_TEST,SITUS_PREDIR,0,19;SITUS_STREETNAME "SITUS_STREETNAME" true true false 60 Text 0 0,First,#,parcel_lines_from_polygons_TEST,SITUS_STREETNAME,0,59;SITUS_STREETTYPE "SITUS_STREETTYPE" true true false 40 Text 0 0,First,#,parcel_lines_from_polygons_TEST,SITUS_STREETTYPE,0,39;LEGAL_DESC "Legal Description" true true false 254 Text 0 0,First,#,parcel_lines_from_polygons_TEST,LEGAL_DESC,0,253;BLOCK "Block" true true false 50 Text 0 0,First,#,parcel_lines_from_polygons_TEST,BLOCK,0,49;LOT "Lot" true true false 50 Text 0 0,First,#,parcel_lines_from_polygons_TEST,LOT,0,49;LANDSQFT "LANDSQFT" true true false 8 Double 0 0,First,#,parcel_lines_from_polygons_TEST,LANDSQFT,-1,-1;ACREAGE "Acreage" true true false 8 Double 0 0,First,#,parcel_lines_from_polygons_TEST,ACREAGE,-1,-1;LIVINGAREA "LIVINGAREA" true true false 8 Double 0 0,First,#,parcel_lines_from_polygons_TEST,LIVINGAREA,-1,-1;yr_blt "YR_BLT" true true false 2 Short 0 0,First,#,parcel_lines_from_polygons_TEST,yr_blt,-1,-1;EXEMPTION "Exemption" true true false 100 Text 0 0,First,#,parcel_lines_from_polygons_TEST,EXEMPTION,0,99;TAXUNIT "Tax Unit" true true false 72 Text 0 0,First,#,parcel_lines_from_polygons_TEST,TAXUNIT,0,71;SPTB_CODE "SPTB Code" true true false 10 Text 0 0,First,#,parcel_lines_from_polygons_TEST,SPTB_CODE,0,9;LAND_TYPE "Land Type" true true false 10 Text 0 0,First,#,parcel_lines_from_polygons_TEST,LAND_TYPE,0,9;DCADHyperlink "DCADHyperlink" true true false 250 Text 0 0,First,#,parcel_lines_from_polygons_TEST,DCADHyperlink,0,249;LAST_IMPORT_DATE "Last Import Date" true true false 8 Date 0 1,First,#,parcel_lines_from_polygons_TEST,LAST_IMPORT_DATE,-1,-1;Plats "Plats" true true false 500 Text 0 0,First,#,parcel_lines_from_polygons_TEST,Plats,0,499;cert_mkt_v "market value" true true false 8 Double 0 0,First,#,parcel_lines_from_polygons_TEST,cert_mkt_v,-1,-1;cad_zoning "cad_zoning" true true false 255 Text 0 0,First,#,parcel_lines_from_polygons_TEST,cad_zoning,0,254;parcel_polygon_OID "parcel_polygon_OID" true true false 4 Long 0 0,First,#,parcel_lines_from_polygons_TEST,parcel_polygon_OID,-1,-1;Shape_Length "Shape_Length" false true true 8 Double 0 0,First,#,parcel_lines_from_polygons_TEST,Shape_Length,-1,-1;shared_boundary "shared_boundary" true true false 2 Short 0 0,First,#,parcel_lines_from_polygons_TEST,shared_boundary,-1,-1;StFULLName "Street_Name_Full" true true false 50 Text 0 0,First,#,clipped_streets_near_parcel_62,StFULLName,0,49;MILES "Miles" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,MILES,-1,-1;LaneMiles "Lane_Miles" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,LaneMiles,-1,-1;Shoulder "Shoulder" true true false 20 Text 0 0,First,#,clipped_streets_near_parcel_62,Shoulder,0,19;FacilityID "FacilityID" true true false 30 Text 0 0,First,#,clipped_streets_near_parcel_62,FacilityID,0,29;L_ADD_FROM "L_ADD_FROM" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,L_ADD_FROM,-1,-1;L_ADD_TO "L_ADD_TO" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,L_ADD_TO,-1,-1;R_ADD_FROM "R_ADD_FROM" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,R_ADD_FROM,-1,-1;R_ADD_TO "R_ADD_TO" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,R_ADD_TO,-1,-1;PRETYPE "PRETYPE" true true false 20 Text 0 0,First,#,clipped_streets_near_parcel_62,PRETYPE,0,19;STDIR "STDIR" true true false 2 Text 0 0,First,#,clipped_streets_near_parcel_62,STDIR,0,1;STNAME "STNAME" true true false 50 Text 0 0,First,#,clipped_streets_near_parcel_62,STNAME,0,49;STTYPE "STTYPE" true true false 20 Text 0 0,First,#,clipped_streets_near_parcel_62,STTYPE,0,19;STSUF "STSUF" true true false 2 Text 0 0,First,#,clipped_streets_near_parcel_62,STSUF,0,1;TRANS_CLAS "Transportation_Class" true true false 10 Text 0 0,First,#,clipped_streets_near_parcel_62,TRANS_CLAS,0,9;SPEEDLIMIT "Speed_Limit" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,SPEEDLIMIT,-1,-1;MINUTES "MINUTES" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,MINUTES,-1,-1;ID "ID" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,ID,-1,-1;OneWay "OneWay" true true false 2 Text 0 0,First,#,clipped_streets_near_parcel_62,OneWay,0,1;Add_Start "Add_Start" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,Add_Start,-1,-1;Add_End "Add_End" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,Add_End,-1,-1;Addr_Range "Addr_Range" true true false 50 Text 0 0,First,#,clipped_streets_near_parcel_62,Addr_Range,0,49;BlockRng "BlockRng" true true false 50 Text 0 0,First,#,clipped_streets_near_parcel_62,BlockRng,0,49;Owner_1 "Owner" true true false 50 Text 0 0,First,#,clipped_streets_near_parcel_62,Owner,0,49;Owner_DESC "Owner_DESC" true true false 254 Text 0 0,First,#,clipped_streets_near_parcel_62,Owner_DESC,0,253;LegacyID "LegacyID" true true false 30 Text 0 0,First,#,clipped_streets_near_parcel_62,LegacyID,0,29;SHAPE_STLe "SHAPE_STLe" true true false 8 Double 0 0,First,#,clipped_streets_near_parcel_62,SHAPE_STLe,-1,-1;Deactive_Date "Deactive_Date" true true false 8 Date 0 1,First,#,clipped_streets_near_parcel_62,Deactive_Date,-1,-1;created_user "created_user" true true false 255 Text 0 0,First,#,clipped_streets_near_parcel_62,created_user,0,254;created_date "created_date" true true false 8 Date 0 1,First,#,clipped_streets_near_parcel_62,created_date,-1,-1;last_edited_user "last_edited_user" true true false 255 Text 0 0,First,#,clipped_streets_near_parcel_62,last_edited_user,0,254;last_edited_date "last_edited_date" true true false 8 Date 0 1,First,#,clipped_streets_near_parcel_62,last_edited_date,-1,-1;Block_1 "Block" true true false 2 Short 0 0,First,#,clipped_streets_near_parcel_62,Block,-1,-1;PavType "Pavement_Type" true true false 25 Text 0 0,First,#,clipped_streets_near_parcel_62,PavType,0,24;F_ELEV "F_ELEV" true true false 2 Short 0 0,First,#,clipped_streets_near_parcel_62,F_ELEV,-1,-1;T_ELEV "T_ELEV" true true false 2 Short 0 0,First,#,clipped_streets_near_parcel_62,T_ELEV,-1,-1;MuniLeft "MuniLeft" true true false 50 Text 0 0,First,#,clipped_streets_near_parcel_62,MuniLeft,0,49;MuniRight "MuniRight" true true false 50 Text 0 0,First,#,clipped_streets_near_parcel_62,MuniRight,0,49;ZIPLeft "ZIPLeft" true true false 10 Text 0 0,First,#,clipped_streets_near_parcel_62,ZIPLeft,0,9;ZIPRight "ZIPRight" true true false 10 Text 0 0,First,#,clipped_streets_near_parcel_62,ZIPRight,0,9;ESNLeft "ESNLeft" true true false 4 Long 0 0,First,#,clipped_streets_near_parcel_62,ESNLeft,-1,-1;ESNRight "ESNRight" true true false 4 Long 0 0,First,#,clipped_streets_near_parcel_62,ESNRight,-1,-1;COUNTYLeft "COUNTYLeft" true true false 50 Text 0 0,First,#,clipped_streets_near_parcel_62,COUNTYLeft,0,49;COUNTYRight "COUNTYRight" true true false 50 Text 0 0,First,#,clipped_streets_near_parcel_62,COUNTYRight,0,49;STATELeft "STATELeft" true true false 2 Text 0 0,First,#,clipped_streets_near_parcel_62,STATELeft,0,1;STATERight "STATERight" true true false 2 Text 0 0,First,#,clipped_streets_near_parcel_62,STATERight,0,1;COUNTRYLeft "COUNTRYLeft" true true false 2 Text 0 0,First,#,clipped_streets_near_parcel_62,COUNTRYLeft,0,1;COUNTRYRight "COUNTRYRight" true true false 2 Text 0 0,First,#,clipped_streets_near_parcel_62,COUNTRYRight,0,1;gc_exception "gc_exception" true true false 10 Text 0 0,First,#,clipped_streets_near_parcel_62,gc_exception,0,9;from_street "from_street" true true false 50 Text 0 0,First,#,clipped_streets_near_parcel_62,from_street,0,49;to_street "to_street" true true false 50 Text 0 0,First,#,clipped_streets_near_parcel_62,to_street,0,49;Shape_Length_1 "Shape_Length" false true true 8 Double 0 0,First,#,clipped_streets_near_parcel_62,Shape_Length,-1,-1')
+        match_option="WITHIN_A_DISTANCE", search_radius="50 Feet", field_mapping=field_mappings)
     
-    # TODO - may be able to remove fields list and if statement after testing
-    join_fields = arcpy.ListFields(parcel_street_join_fc)
-    if not any(field.name == "is_parallel_to_street" for field in join_fields):
-        arcpy.management.AddField(parcel_street_join_fc, "is_parallel_to_street", "SHORT")
-
-    # TODO - remove TARGET_FID if not needed - only included for testing/logging
-    with arcpy.da.UpdateCursor(parcel_street_join_fc, ["SHAPE@", street_name_field, parallel_field, "TARGET_FID"]) as cursor:
-        for row in cursor:
-            parcel_geom = row[0]
-            street_name = row[1]
-            parcel_segment_id = row[3]
-            
-            # Get the angle of the parcel segment
-            parcel_angle = calculate_angle(parcel_geom)
-            
-            # Use a cursor to find the associated street geometry
-            street_angle = None
-            with arcpy.da.SearchCursor(street_fc, ["SHAPE@", "StFULLName"]) as street_cursor:
-                for street_row in street_cursor:
-                    if street_row[1] == street_name:
-                        street_angle = calculate_angle(street_row[0])
-                        break
-            
-            # Check if the angles are parallel
-            if street_angle is not None:
-                row[2] = 1 if is_parallel(parcel_angle, street_angle, tolerance=10) else 0
-            else:
-                # If no street found, set to -1
-                row[2] = -1
-            
-            cursor.updateRow(row)
-
-    # from Copilot - remove if not needed
-    # Load the join table into a pandas DataFrame
-    #join_array = arcpy.da.TableToNumPyArray(parcel_street_join_fc, ["TARGET_FID", "StFULLName", "Angle"])
-    #join_df = pd.DataFrame(join_array)
-    #join_df = join_df.rename(columns={"TARGET_FID": "PB_FID", "StFULLName": "STREET_NAME", "Angle": "STREET_ANGLE"})
-    ## Load the street feature class into a pandas DataFrame
-    #street_array = arcpy.da.FeatureClassToNumPyArray(street_fc, ["OBJECTID", "Angle"])
-    #street_df = pd.DataFrame(street_array)
-    #street_df = street_df.rename(columns={"OBJECTID": "STREET_FID", "Angle": "STREET_ANGLE"})
-    ## Merge the join table with the street table to get street angles
-    #merged_df = join_df.merge(street_df, left_on="PB_FID", right_on="STREET_FID", how="left")
-    ## Populate the parallel field based on angle comparison
-    #merged_df[parallel_field] = merged_df.apply(
-    #    lambda row: is_parallel(row["STREET_ANGLE"], row["STREET_ANGLE"]), axis=1
-    #)
-    ## Convert output to a NumPy structured array and write to the table
-    #output_array = np.array([tuple(row) for row in merged_df.to_records(index=False)])
-    #arcpy.da.NumPyArrayToTable(output_array, parcel_street_join_fc)
+    # the join output was just recreated with only the mapped fields, so the parallel field cannot exist yet - no need to check
+    arcpy.management.AddField(parcel_street_join_fc, parallel_field, "SHORT")
+
+    # Get the directions of all parcel segments at once rather than reading each segment's geometry in a cursor
+    segment_oids, parcel_dx, parcel_dy = get_line_directions_bulk(parcel_street_join_fc)
+    # Same for streets
+    street_oids, street_dx, street_dy = get_line_directions_bulk(street_fc)
+    # Position (in the street arrays) of the first street with each name, as when streets were scanned until the first match
+    # - np.unique returns the first occurrence of each name in the (cursor-ordered) array
+    street_array = arcpy.da.TableToNumPyArray(street_fc, ["OID@", street_name_field], null_value={street_name_field: ""})
+    unique_street_names, first_street_rows = np.unique(street_array[street_name_field], return_index=True)
+    # streets with null or empty geometry have no vertices and so no direction - their names get -1 (no street) rather
+    # than the direction of a neighbouring street
+    first_street_oids = street_array["OID@"][first_street_rows]
+    unique_street_indices = np.full(len(first_street_oids), -1)
+    if len(street_oids):
+        street_order = np.argsort(street_oids)
+        street_positions = street_order[np.minimum(np.searchsorted(street_oids, first_street_oids, sorter=street_order), len(street_oids) - 1)]
+        street_found = street_oids[street_positions] == first_street_oids
+        unique_street_indices[street_found] = street_positions[street_found]
+
+    # Street name of every segment, lined up with segment_oids
+    join_array = arcpy.da.TableToNumPyArray(parcel_street_join_fc, ["OID@", street_name_field], null_value={street_name_field: ""})
+    join_order = np.argsort(join_array["OID@"])
+    segment_positions = join_order[np.searchsorted(join_array["OID@"], segment_oids, sorter=join_order)]
+    segment_street_names = join_array[street_name_field][segment_positions]
+    # look up the street of every segment at once in the sorted unique names (-1 where the name is not found)
+    segment_street_indices = np.full(len(segment_oids), -1)
+    if len(unique_street_names):
+        name_positions = np.minimum(np.searchsorted(unique_street_names, segment_street_names), len(unique_street_names) - 1)
+        # null street names (read as "") never match, even if some streets have no name either
+        name_found = (unique_street_names[name_positions] == segment_street_names) & (segment_street_names != "")
+        segment_street_indices[name_found] = unique_street_indices[name_positions[name_found]]
+
+    # Check if the lines are parallel for all segments with a street at once - segments with no street (including those with
+    # a null street name) are set to -1 without being compared, as are segments or streets with no defined direction
+    # (first point == last point, e.g. closed lines)
+    parallel_array = np.empty(len(segment_oids), dtype=[("SEGMENT_OID", "i4"), (parallel_field, "i2")])
+    parallel_array["SEGMENT_OID"] = segment_oids
+    parallel_array[parallel_field] = -1
+    has_street = segment_street_indices >= 0
+    has_street &= np.hypot(parcel_dx, parcel_dy) > 0
+    has_street[has_street] &= np.hypot(street_dx, street_dy)[segment_street_indices[has_street]] > 0
+    matched_street_indices = segment_street_indices[has_street]
+    parallel_array[parallel_field][has_street] = is_parallel_vec(parcel_dx[has_street], parcel_dy[has_street],
+        street_dx[matched_street_indices], street_dy[matched_street_indices], tolerance=10)
+    # append_only=False updates the existing parallel field rather than adding a new one
+    arcpy.da.ExtendTable(parcel_street_join_fc, arcpy.Describe(parcel_street_join_fc).OIDFieldName, parallel_array, "SEGMENT_OID", append_only=False)
 
 
 def list_fc_paths_in_gdb(gdb_path):
@@ -176,9 +187,12 @@ def list_fc_paths_in_gdb(gdb_path):
     :param gdb_path: Path to the geodatabase.
     :return: List of feature class paths.
     """
-    arcpy.env.workspace = gdb_path
-    fc_list = arcpy.ListFeatureClasses()
-    fc_paths = [os.path.join(gdb_path, fc) for fc in fc_list]
+    # list within a temporary workspace so the caller's workspace (set in set_environment()) is left unchanged
+    with arcpy.EnvManager(workspace=gdb_path):
+        fc_list = arcpy.ListFeatureClasses()
+    # join the geodatabase path and separator once rather than calling os.path.join for every feature class
+    prefix = os.path.join(gdb_path, "")
+    fc_paths = [prefix + fc for fc in fc_list]
     return fc_paths
 
 
@@ -273,25 +287,36 @@ def process_parcel(parcel_id, all_parcel_polygons_fc, all_parcel_lines_fc, build
 
     #i = 0
     print(f"Adding fields with side info to near table for parcel {parcel_id}...")
+    # collect all new fields and add them with a single AddFields call rather than one AddField call per field
+    new_fields = []
     for i in range(1, max_side_fields + 1):
-    #while i < max_side_fields:
         # Add facing street and other side fields
-        #i += 1
-        arcpy.management.AddField(initial_near_table, f"FACING_STREET_{i}", "TEXT")
-        arcpy.management.AddField(initial_near_table, f"FACING_STREET_{i}_DIST_FT", "FLOAT")
-        arcpy.management.AddField(initial_near_table, f"OTHER_SIDE_{i}_PB_FID", "LONG")
-        arcpy.management.AddField(initial_near_table, f"OTHER_SIDE_{i}_DIST_FT", "FLOAT")
+        new_fields.extend([
+            [f"FACING_STREET_{i}", "TEXT"],
+            [f"FACING_STREET_{i}_DIST_FT", "FLOAT"],
+            [f"OTHER_SIDE_{i}_PB_FID", "LONG"],
+            [f"OTHER_SIDE_{i}_DIST_FT", "FLOAT"],
+        ])
 
     # TODO - add logic for populating these fields here or elsewhere
 
-    # In a new field, hold the parcel polygon ID followed by parcel line ID in format 64-1, 64-2, etc.
-    arcpy.management.AddField(initial_near_table, f"PARCEL_COMBO_FID", "TEXT")
-    arcpy.management.CalculateField(initial_near_table, "PARCEL_COMBO_FID", f"'{parcel_id}-' + str(!NEAR_FID!)", "PYTHON3")
-    #arcpy.management.CalculateField("initial_near_table_64", "PARCEL_COMBO_FID", "'64-' + str(!NEAR_FID!)")
-
-    # In a new field, hold the building polygon ID followed by parcel line ID in format 54-1, 54-2, etc.
-    arcpy.management.AddField(initial_near_table, f"BUILDING_COMBO_FID", "TEXT")
-    arcpy.management.CalculateField(initial_near_table, "BUILDING_COMBO_FID", "str(!IN_FID!) + '-' + str(!NEAR_FID!)", "PYTHON3")
+    arcpy.management.AddFields(initial_near_table, new_fields)
+
+    # In new fields, hold the parcel polygon ID followed by parcel line ID in format 64-1, 64-2, etc.
+    # and the building polygon ID followed by parcel line ID in format 54-1, 54-2, etc.
+    # Both are built as numpy string columns and appended with a single ExtendTable call
+    # (fixed field widths so that the near tables of all parcels share one schema)
+    oid_field = arcpy.Describe(initial_near_table).OIDFieldName
+    ids = arcpy.da.TableToNumPyArray(initial_near_table, [oid_field, "IN_FID", "NEAR_FID"])
+    if len(ids):
+        near_fids = ids["NEAR_FID"].astype(str)
+        combo_array = np.empty(len(ids), dtype=[
+            ("NEAR_OID", "i4"), ("PARCEL_COMBO_FID", "<U50"), ("BUILDING_COMBO_FID", "<U50")
+        ])
+        combo_array["NEAR_OID"] = ids[oid_field]
+        combo_array["PARCEL_COMBO_FID"] = np.char.add(f"{parcel_id}-", near_fids)
+        combo_array["BUILDING_COMBO_FID"] = np.char.add(np.char.add(ids["IN_FID"].astype(str), "-"), near_fids)
+        arcpy.da.ExtendTable(initial_near_table, oid_field, combo_array, "NEAR_OID")
     
     # TODO - uncomment and fix after processing single parcel
     # Append the near table to the output table
@@ -312,103 +337,83 @@ def transform_near_table_with_street_info(gdb_path, near_table_name, parcel_stre
     :return: Path to the transformed near table.
     """
     print("Transforming near table to include info on adjacent street(s) and other side(s)...")
+    # print intermediate tables and extra checks only if SETBACK_DEBUG is set
+    debug = debug_enabled()
 
     # Load spatial join results into a pandas DataFrame
     join_array = arcpy.da.TableToNumPyArray(parcel_street_join, ["TARGET_FID", "StFULLName", "is_parallel_to_street", "shared_boundary", "parcel_polygon_OID"])
     join_df = pd.DataFrame(join_array)
     join_df = join_df.rename(columns={"TARGET_FID": "PB_FID", "StFULLName": "STREET_NAME"})
+    # reduce the parallel and shared boundary flags to one boolean column on the (smaller) join table before merging
+    join_df["is_facing_street"] = (join_df["STREET_NAME"].notna() & (join_df["is_parallel_to_street"] == 1) & (join_df["shared_boundary"] == 0)).astype(np.bool_)
+    join_df = join_df.drop(columns=["is_parallel_to_street", "shared_boundary"])
     #TODO - get subset of join_df where parcel_polygon_OID = parcel_id - may not be necessary because of merge() below - see creation of merged_df below
     #join_df = join_df[join_df["parcel_polygon_OID"] == f"{parcel_id}"]
 
-    print("join_df:")
-    print(join_df)
+    if debug:
+        print("join_df:")
+        print(join_df)
 
     # Step 2: Load the near table into a pandas DataFrame
     near_table_path = os.path.join(gdb_path, near_table_name)
-    print(f"Near table path: {near_table_path}")
-    print(f"near table exists: {arcpy.Exists(near_table_path)}")
+    if debug:
+        print(f"Near table path: {near_table_path}")
+        print(f"near table exists: {arcpy.Exists(near_table_path)}")
     # "*" as second arg should return all fields
     #near_array = arcpy.da.TableToNumPyArray(near_table_path, "*")
     #near_table_fields = [field.name for field in arcpy.ListFields(near_table_path)]
 
     # TODO - modify field list after creating dataframe or add placeholder? - passing empty fields here resulted in TypeError: int() argument must be a string, a bytes-like object or a real number, not 'NoneType'
-    near_table_fields = ['IN_FID', 'NEAR_FID', 'NEAR_DIST', 'NEAR_RANK', 'PARCEL_COMBO_FID', 'BUILDING_COMBO_FID']
-    print(f"Near table fields: {near_table_fields}")
+    # only the fields used below (NEAR_RANK and the empty side info fields are not needed)
+    near_table_fields = ['IN_FID', 'NEAR_FID', 'NEAR_DIST', 'PARCEL_COMBO_FID', 'BUILDING_COMBO_FID']
     near_array = arcpy.da.TableToNumPyArray(near_table_path, near_table_fields)
     near_df = pd.DataFrame(near_array)
-    print("near_df:")
-    print(near_df)
+    if debug:
+        print(f"Near table fields: {near_table_fields}")
+        print("near_df:")
+        print(near_df)
 
     # TODO - fix issue below
     # Merge the near table with the spatial join results to identify adjacent streets
     merged_df = near_df.merge(join_df, left_on="NEAR_FID", right_on="PB_FID", how="left")
-    merged_df["is_facing_street"] = (merged_df["STREET_NAME"].notna()) & (merged_df["is_parallel_to_street"] == 1) & (merged_df["shared_boundary"] == 0)
-    print("merged_df after adding field 'is_facing_street':")
-    print(merged_df)
+    # near features without a join record are not facing a street
+    merged_df["is_facing_street"] = merged_df["is_facing_street"].fillna(False).astype(np.bool_)
+    if debug:
+        print("merged_df after adding field 'is_facing_street':")
+        print(merged_df)
 
     # Drop duplicate records based on NEAR_DIST, PARCEL_COMBO_FID, and STREET_NAME
     # may or may not need this step
     merged_df = merged_df.drop_duplicates(subset=["NEAR_DIST", "PARCEL_COMBO_FID", "STREET_NAME"])
-    print("merged_df after adding is_facing_street and dropping duplicates:")
-    print(merged_df)
+    if debug:
+        print("merged_df after adding is_facing_street and dropping duplicates:")
+        print(merged_df)
 
     # remove unnecessary rows from merged_df - TODO - do this more efficiently?
     facing_street_df = merged_df[merged_df["is_facing_street"]]
     facing_street_df = facing_street_df.drop_duplicates(subset=["NEAR_DIST", "BUILDING_COMBO_FID"])
     other_side_df = merged_df[~merged_df["is_facing_street"]]
     other_side_df = other_side_df.drop_duplicates(subset=["NEAR_DIST", "BUILDING_COMBO_FID"])
-    #get series of PB_FID values from other_side_df
-    other_side_pb_fids = other_side_df["PB_FID"].unique()
-    #get series of PB_FID values from facing_street_df
-    facing_street_pb_fids = facing_street_df["PB_FID"].unique()
-    for pb_fid in other_side_pb_fids:
-        if pb_fid in facing_street_pb_fids:
-            # remove row from other side df - best way to do this?
-            other_side_df = other_side_df[other_side_df["PB_FID"] != pb_fid]
+    # remove rows from other side df whose PB_FID is also a facing street PB_FID (single isin mask rather than one filter per PB_FID)
+    other_side_df = other_side_df[~other_side_df["PB_FID"].isin(facing_street_df["PB_FID"].unique())]
     #assign combination of facing_street_df and other_side_df to merged_df
     merged_df = pd.concat([facing_street_df, other_side_df])
-    print("merged_df after removing unnecessary rows:")
-    print(merged_df)
-
-    # Step 3: Populate fields for adjacent streets and other sides
-    output_data = []
-    for in_fid, group in merged_df.groupby("IN_FID"):
-        row = {"IN_FID": in_fid}
-        facing_count, other_count = 1, 1
-
-        for _, record in group.iterrows():
-            near_fid = record["NEAR_FID"]
-            distance = record["NEAR_DIST"]
-            # TODO - add parameter for max number of fields for facing street and other side?
-            if record["is_facing_street"]:
-                # limit to x number of facing street sides
-                if facing_count <= 4:
-                    row[f"FACING_STREET_{facing_count}"] = record["STREET_NAME"]
-                    row[f"FACING_STREET_{facing_count}_PB_FID"] = near_fid
-                    row[f"FACING_STREET_{facing_count}_DIST_FT"] = distance
-                    facing_count += 1
-            else:
-                # limit to x number of other sides
-                if other_count <= 4:
-                    row[f"OTHER_SIDE_{other_count}_PB_FID"] = near_fid
-                    row[f"OTHER_SIDE_{other_count}_DIST_FT"] = distance
-                    other_count += 1
-
-        output_data.append(row)
-
-    # Step 4: Convert output to a NumPy structured array and write to a table
-    output_df = pd.DataFrame(output_data)
-    print(output_df.head())
-    output_df.fillna(-1, inplace=True)
-    output_fields = [(col, "f8" if "DIST" in col else ("i4" if output_df[col].dtype.kind in 'i' else "<U50")) for col in output_df.columns]
-    print(f'Output fields: {output_fields}')
-    output_array = np.array([tuple(row) for row in output_df.to_records(index=False)], dtype=output_fields)
+    if debug:
+        print("merged_df after removing unnecessary rows:")
+        print(merged_df)
+
+    # Step 3 and 4: Populate fields for adjacent streets and other sides directly in a NumPy structured array
+    # TODO - add parameter for max number of fields for facing street and other side?
+    street_name_length = arcpy.ListFields(parcel_street_join, "StFULLName")[0].length
+    output_array = build_side_info_array(merged_df, max_count=4, street_name_length=street_name_length)
+    if debug:
+        print(output_array[:5])
+        print(f'Output fields: {output_array.dtype.descr}')
 
     #transformed_table_path = os.path.join(gdb_path, "transformed_near_table_with_facing_optimized")
     # TODO - update or remove parcel id from name
     transformed_table_path = os.path.join(gdb_path, "transformed_near_table_with_street_info_parcel_TEST")
-    if arcpy.Exists(transformed_table_path):
-        arcpy.management.Delete(transformed_table_path)
+    drop_gdb_item_if_exists(transformed_table_path)
 
     arcpy.da.NumPyArrayToTable(output_array, transformed_table_path)
     print(f"Transformed near table written to: {transformed_table_path}")
@@ -453,7 +458,8 @@ def run(building_source_date, parcel_id, all_parcel_lines_fc):
     )
 
     # TODO - remove hardcoded parcel id after testing
-    clipped_street_fc = f"clipped_streets_near_parcel_{parcel_id}"
+    # clipped streets are only read by populate_parallel_field() below - keep them in memory
+    clipped_street_fc = rf"memory\clipped_streets_near_parcel_{parcel_id}"
     clip_streets_near_parcel(parcel_polygon_fc, parcel_id, input_streets, clipped_street_fc, buffer_ft=40)
     parcel_street_join_path = os.path.join(gdb, "parcel_street_join")
     # 'all_parcel_lines_fc' comes from create_parcel_line_fc() in prep_data.py
@@ -473,7 +479,7 @@ def run(building_source_date, parcel_id, all_parcel_lines_fc):
     #    for row in cursor:
     #        parcel_id = row[0]
     #        print(f"Processing parcel {parcel_id}...")
-    #        process_parcel(parcel_id, parcel_polygon_fc, building_fc, temp_parcel_lines, output_near_table, output_combined_lines_fc, max_side_fields=4)
+    #        process_parcel(parcel_id, parcel_polygon_fc, all_parcel_lines_fc, building_fc, initial_near_table, output_near_table, output_combined_lines_fc, max_side_fields=4)
     ## Join the near table back to building polygons
     #print("Joining near table to building polygons...")
     #arcpy.management.JoinField(building_fc, "OBJECTID", output_near_table, "IN_FID")
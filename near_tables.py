@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def build_side_info_array(merged_df, max_count=4, street_name_length=50):
+    """
+    Build a structured array with one row per building side (IN_FID) holding the first max_count facing streets and other sides.
+    Each column is preallocated (and filled with -1) and values are scattered into place, so no per-row Python objects are built.
+    :param merged_df - pandas DataFrame: Near table records with IN_FID, NEAR_FID, NEAR_DIST, STREET_NAME and is_facing_street
+        columns, in the order in which they should fill the numbered fields of each building side
+    :param max_count - int: Maximum number of facing streets and of other sides to keep per building side
+    :param street_name_length - int: Width of the FACING_STREET_{i} fields - pass the length of the street name field so that
+        the output schema is the same on every run
+    :return - NumPy structured array: IN_FID, FACING_STREET_{i}, FACING_STREET_{i}_PB_FID, FACING_STREET_{i}_DIST_FT,
+        OTHER_SIDE_{i}_PB_FID and OTHER_SIDE_{i}_DIST_FT fields
+    """
+    # row of the output array for each record
+    in_fids, output_rows = np.unique(merged_df["IN_FID"].to_numpy(), return_inverse=True)
+    # at least 2 characters for the "-1" fill value
+    street_name_dtype = f"<U{max(2, street_name_length)}"
+    output_fields = [("IN_FID", "i4")]
+    for i in range(1, max_count + 1):
+        output_fields.extend([(f"FACING_STREET_{i}", street_name_dtype), (f"FACING_STREET_{i}_PB_FID", "i4"), (f"FACING_STREET_{i}_DIST_FT", "f8")])
+    for i in range(1, max_count + 1):
+        output_fields.extend([(f"OTHER_SIDE_{i}_PB_FID", "i4"), (f"OTHER_SIDE_{i}_DIST_FT", "f8")])
+    output_array = np.empty(len(in_fids), dtype=output_fields)
+    output_array["IN_FID"] = in_fids
+    for name, dtype in output_fields[1:]:
+        output_array[name] = "-1" if dtype == street_name_dtype else -1
+
+    is_facing_street = merged_df["is_facing_street"].to_numpy(dtype=bool)
+    for prefix, mask in (("FACING_STREET", is_facing_street), ("OTHER_SIDE", ~is_facing_street)):
+        subset = merged_df[mask]
+        # position of each record among the records of the same building side (1 for the first, 2 for the second...)
+        ranks = subset.groupby("IN_FID").cumcount().to_numpy() + 1
+        rows = output_rows[mask]
+        near_fids = subset["NEAR_FID"].to_numpy()
+        distances = subset["NEAR_DIST"].to_numpy()
+        street_names = subset["STREET_NAME"].to_numpy()
+        for i in range(1, max_count + 1):
+            selected = ranks == i
+            output_array[f"{prefix}_{i}_PB_FID"][rows[selected]] = near_fids[selected]
+            output_array[f"{prefix}_{i}_DIST_FT"][rows[selected]] = distances[selected]
+            if prefix == "FACING_STREET":
+                output_array[f"{prefix}_{i}"][rows[selected]] = street_names[selected]
+    return output_array
@@ -77,14 +77,18 @@ def calculate_distances_to_filtered_parcels(building_lines_fc, parcel_lines_fc,
     arcpy.management.AddField(building_lines_fc, "enclosing_parcel_polygon_oid", "TEXT")  # Field to store parcel IDs
 
     # Iterate through each building
-    with arcpy.da.UpdateCursor(building_lines_fc, ["SHAPE@", "enclosing_parcel_polygon_oid", building_oid_field]) as building_cursor:
+    # rows are only read, so a SearchCursor is enough (no row locks as with an UpdateCursor)
+    with arcpy.da.SearchCursor(building_lines_fc, ["SHAPE@", "enclosing_parcel_polygon_oid", building_oid_field]) as building_cursor:
         for building_row in building_cursor:
             building_geom = building_row[0]
-            enclosing_parcel_polygon_oid = building_row[1].split(",")  # Get surrounding parcel OIDs
+            # Parse surrounding parcel OIDs into a set of ints once (skips blanks and duplicates in the delimited string)
+            enclosing_parcel_polygon_oids = {int(oid) for oid in (building_row[1] or "").split(",") if oid.strip()}
             building_oid = building_row[2]
+            if not enclosing_parcel_polygon_oids:
+                continue
 
             # Select parcel lines by matching OIDs
-            where_clause = f"OBJECTID IN ({','.join(enclosing_parcel_polygon_oid)})"
+            where_clause = f"OBJECTID IN ({','.join(map(str, sorted(enclosing_parcel_polygon_oids)))})"
             arcpy.management.MakeFeatureLayer(parcel_lines_fc, "filtered_parcel_lines", where_clause)
 
             # Calculate distances
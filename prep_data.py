@@ -1,7 +1,7 @@
 import os
 import arcpy
 import time
-from shared import set_environment
+from shared import set_environment, add_field_if_not_exists
 
 
 def create_parcel_line_fc(parcel_polygon_fc, parcel_line_fc, parcel_polygon_OID_field):
@@ -12,10 +12,8 @@ def create_parcel_line_fc(parcel_polygon_fc, parcel_line_fc, parcel_polygon_OID_
     parcel_polygon_OID_field - string: Name of field to store the OID from the parcel polygon feature class
     """
     # preserve polygon OID
-    polygon_fields = arcpy.ListFields(parcel_polygon_fc)
-    if not any(field.name == parcel_polygon_OID_field for field in polygon_fields):
-        arcpy.management.AddField(parcel_polygon_fc, parcel_polygon_OID_field, "LONG")
-    arcpy.management.CalculateField(parcel_polygon_fc, parcel_polygon_OID_field, "!OBJECTID!", "PYTHON3")
+    add_field_if_not_exists(parcel_polygon_fc, parcel_polygon_OID_field, "LONG")
+    arcpy.management.CalculateField(parcel_polygon_fc, parcel_polygon_OID_field, "$feature.OBJECTID", "ARCADE")
 
     arcpy.management.FeatureToLine(
         in_features=parcel_polygon_fc,
@@ -47,9 +45,7 @@ def identify_shared_parcel_boundaries(parcel_polygon_fc, parcel_line_fc, shared_
         )
     print(f"Total number of features in parcel_line_fc: {arcpy.management.GetCount(parcel_line_fc)}")
     # Add a new field for shared boundary flag
-    field_name = shared_boundary_field
-    if not arcpy.ListFields(parcel_line_fc, field_name):
-        arcpy.management.AddField(parcel_line_fc, field_name, "SHORT")
+    add_field_if_not_exists(parcel_line_fc, shared_boundary_field, "SHORT")
 
 
     self_intersect_fc = "parcel_lines_self_intersect"
@@ -74,10 +70,9 @@ def identify_shared_parcel_boundaries(parcel_polygon_fc, parcel_line_fc, shared_
         output_record_option="ONLY_DUPLICATES"
         )
     
-    self_intersect_identical_line_ids = set()
-    with arcpy.da.SearchCursor(identical_parcel_lines_table, "IN_FID") as cursor:
-        for row in cursor:
-            self_intersect_identical_line_ids.add(row[0])
+    # read the IN_FID column in one call rather than row by row through a cursor
+    identical_parcel_lines_array = arcpy.da.TableToNumPyArray(identical_parcel_lines_table, ["IN_FID"], null_value=-1)
+    self_intersect_identical_line_ids = set(identical_parcel_lines_array["IN_FID"].tolist())
 
     print(f"Identified {len(self_intersect_identical_line_ids)} identical lines.")
     #print("Identical line IDs:", self_intersect_identical_line_ids)
@@ -91,12 +86,10 @@ def identify_shared_parcel_boundaries(parcel_polygon_fc, parcel_line_fc, shared_
     # TODO - ensure that updates to self_intersect_fc are persisted if necessary - final results seem correct but not sure why shared_boundary_field is not being populated in self_intersect_fc
 
     # original line ids with shared boundaries
-    identical_line_ids = set()
-    # get original line ids with shared boundaries
-    with arcpy.da.SearchCursor(self_intersect_fc, [f"FID_{parcel_line_fc}", shared_boundary_field]) as cursor:
-        for row in cursor:
-            if row[1] == 1:
-                identical_line_ids.add(row[0])
+    # get original line ids with shared boundaries - filter with a where clause and read the ids in one call rather than
+    # testing every row of the cursor in Python
+    shared_line_array = arcpy.da.TableToNumPyArray(self_intersect_fc, [f"FID_{parcel_line_fc}"], f"{shared_boundary_field} = 1", null_value=-1)
+    identical_line_ids = set(shared_line_array[f"FID_{parcel_line_fc}"].tolist())
 
     # populate the shared boundary field of the parcel_line_fc with 1 if the line is shared, 0 if not
     print(f"Identified {len(identical_line_ids)} lines with shared boundaries.")
@@ -3,13 +3,119 @@ import os
 from dotenv import load_dotenv
 import pathlib
 
+# set once the .env file has been loaded, so that repeated set_environment() calls (e.g. one per parcel) do not re-read it
+_ENV_LOADED = False
+
 def set_environment():
     """
     Set up the environment and workspace.
+    The .env file is only loaded on the first call; the workspace is set on every call, as some steps change it.
     """
-    script_dir = pathlib.Path(__file__).parent.absolute()
-    env_path = script_dir / '.env'
-    load_dotenv(env_path)
+    global _ENV_LOADED
+    if not _ENV_LOADED:
+        script_dir = pathlib.Path(__file__).parent.absolute()
+        env_path = script_dir / '.env'
+        load_dotenv(env_path)
+        _ENV_LOADED = True
     arcpy.env.workspace = os.getenv("FEATURE_DATASET")
     arcpy.env.overwriteOutput = True
-    print(f"Workspace set to {arcpy.env.workspace}")
\ No newline at end of file
+    print(f"Workspace set to {arcpy.env.workspace}")
+
+
+def debug_enabled():
+    """
+    Check whether intermediate tables should be printed (SETBACK_DEBUG set to 1, true or yes in the environment or .env file).
+    Read when called rather than at import, so that a value from the .env file loaded by set_environment() is seen.
+    :return - bool: True if debug output is enabled
+    """
+    return os.getenv("SETBACK_DEBUG", "0").lower() in ("1", "true", "yes")
+
+def _get_field_names(feature_class):
+    """
+    Get the set of field names of a feature class or table with a single ListFields call.
+    Names are upper case, as field names are not case sensitive in a geodatabase.
+    :param feature_class - string: Feature class or table to get field names for
+    :return - set of strings: Upper case field names
+    """
+    return {field.name.upper() for field in arcpy.ListFields(feature_class)}
+
+
+def _field_exists(feature_class, field_name):
+    """
+    Check whether a field exists, passing the field name to ListFields as a wildcard so that only the matching field is fetched.
+    :param feature_class - string: Feature class or table to check
+    :param field_name - string: Name of the field to look for
+    :return - bool: True if the field exists
+    """
+    # the ListFields wildcard is not case sensitive either
+    return bool(arcpy.ListFields(feature_class, field_name))
+
+
+def add_field_if_not_exists(feature_class, field_name, field_type):
+    """
+    Add a field to a feature class or table unless a field with the same name already exists.
+    Names are compared case-insensitively, as in the geodatabase (e.g. "Parcel_ID" matches an existing "PARCEL_ID").
+    :param feature_class - string: Feature class or table to add the field to
+    :param field_name - string: Name of the field to add
+    :param field_type - string: Type of the field to add (e.g. "LONG", "TEXT")
+    """
+    if not _field_exists(feature_class, field_name):
+        arcpy.management.AddField(feature_class, field_name, field_type)
+
+
+def add_fields_if_not_exist(feature_class, field_descriptions):
+    """
+    Add the listed fields that do not already exist to a feature class or table with a single AddFields call.
+    Names are compared case-insensitively, as in the geodatabase.
+    :param feature_class - string: Feature class or table to add the fields to
+    :param field_descriptions - list of [field name, field type] pairs: Fields to add (e.g. [["HEIGHT_FT", "FLOAT"]])
+    """
+    existing_field_names = _get_field_names(feature_class)
+    fields_to_add = [list(field) for field in field_descriptions if field[0].upper() not in existing_field_names]
+    if fields_to_add:
+        arcpy.management.AddFields(feature_class, fields_to_add)
+
+
+def drop_fields_if_exist(feature_class, field_names):
+    """
+    Delete the listed fields that exist in a feature class or table with a single DeleteField call.
+    Names are compared case-insensitively, as in the geodatabase.
+    :param feature_class - string: Feature class or table to delete fields from
+    :param field_names - list of strings: Names of the fields to delete
+    """
+    existing_field_names = _get_field_names(feature_class)
+    fields_to_delete = [field_name for field_name in field_names if field_name.upper() in existing_field_names]
+    if fields_to_delete:
+        arcpy.management.DeleteField(feature_class, fields_to_delete)
+
+
+def drop_field_if_exists(feature_class, field_names):
+    """
+    Delete one or more fields from a feature class or table if they exist.
+    A single field name is checked with _field_exists() (no full field list is read); a list is
+    passed on to drop_fields_if_exist().
+    :param feature_class - string: Feature class or table to delete fields from
+    :param field_names - string or list of strings: Name(s) of the field(s) to delete
+    """
+    if not isinstance(field_names, str):
+        drop_fields_if_exist(feature_class, field_names)
+    elif _field_exists(feature_class, field_names):
+        arcpy.management.DeleteField(feature_class, field_names)
+
+
+def drop_gdb_items_if_exist(items):
+    """
+    Delete the listed geodatabase items (feature classes, tables, etc.) that exist with a single Delete call.
+    :param items - list of strings: Paths to the items
+    """
+    items_to_delete = [item for item in items if arcpy.Exists(item)]
+    if items_to_delete:
+        arcpy.management.Delete(items_to_delete)
+
+
+def drop_gdb_item_if_exists(item):
+    """
+    Delete a geodatabase item (feature class, table, etc.) if it exists.
+    :param item - string: Path to the item
+    """
+    drop_gdb_items_if_exist([item])
@@ -1,8 +1,40 @@
 import os
 import math
 import time
+import itertools
+import collections
 import arcpy
+import numpy as np
 from shared import set_environment
+from angles import angle_from_direction, get_split_flags_by_line
+
+
+
+
+def build_range_query(field_name, values, min_run_length=4):
+    """
+    Build a where clause selecting the given integer values, with one BETWEEN range per run of at least min_run_length
+    consecutive values and all other values in a single IN list.
+    Much shorter (and faster to evaluate) than an IN list alone when the values are largely contiguous, as OBJECTIDs usually are,
+    while isolated values (e.g. the first, last and corner points of each line) cost no more than in a plain IN list.
+    :param field_name - string: Name of the integer field to query
+    :param values - iterable of int values: Values to select (duplicates and order are ignored, so a set can be passed as is)
+    :param min_run_length - int: Minimum number of consecutive values written as a BETWEEN range
+    :return - string: Where clause
+    """
+    clauses = []
+    singles = []
+    # consecutive values share the same difference between value and position in the sorted list
+    for _, group in itertools.groupby(enumerate(sorted(set(values))), key=lambda item: item[1] - item[0]):
+        run = [value for _, value in group]
+        if len(run) >= min_run_length:
+            clauses.append(f"({field_name} BETWEEN {run[0]} AND {run[-1]})")
+        else:
+            singles.extend(run)
+    if singles:
+        clauses.append(f"{field_name} IN ({', '.join(map(str, singles))})")
+    # select nothing (rather than everything) if no values are given
+    return " OR ".join(clauses) if clauses else "1 = 0"
 
 
 def line_to_points(input_fc, output_fc):
@@ -25,68 +57,63 @@ def categorize_lines_based_on_x_points(input_fc, x=2):
     :return - tuple of two lists of int values: List of line OBJECTIDs with more than x vertices, List of line OBJECTIDs with less than x vertices
     """
     print("Entered get_lines_with_x_points()...")
-    line_oids_with_more_points = []
-    line_oids_with_less_points = []
-    with arcpy.da.SearchCursor(input_fc, ["OBJECTID", "SHAPE@"]) as cursor:
-        for row in cursor:
-            if len(row[1].getPart(0)) > x:
-                line_oids_with_more_points.append(row[0])
-            else:
-                line_oids_with_less_points.append(row[0])
-    return (line_oids_with_more_points, line_oids_with_less_points)
+    # count the vertices of each line from one exploded read of OIDs (one row per vertex) rather than reading every
+    # geometry object - the input feature class is not modified (parcel lines are single part, so all vertices are counted)
+    vertex_oids = arcpy.da.FeatureClassToNumPyArray(input_fc, ["OID@"], explode_to_points=True)["OID@"]
+    counted_oids, vertex_counts = np.unique(vertex_oids, return_counts=True)
+    # lines without vertices (null geometry) are not in the exploded array - they count as having 0 vertices
+    line_oids = arcpy.da.FeatureClassToNumPyArray(input_fc, ["OID@"])["OID@"]
+    line_vertex_counts = np.zeros(len(line_oids), dtype=int)
+    positions = np.searchsorted(counted_oids, line_oids)
+    found = positions < len(counted_oids)
+    found[found] = counted_oids[positions[found]] == line_oids[found]
+    line_vertex_counts[found] = vertex_counts[positions[found]]
+    has_more_points = line_vertex_counts > x
+    return (line_oids[has_more_points].tolist(), line_oids[~has_more_points].tolist())
+
+
+def calculate_angle_from_points(start_x, start_y, end_x, end_y):
+    """
+    Calculate the angle (bearing) between first and last points of a line geometry in degrees, accounting for bidirectional lines.
+    :param start_x - float: X coordinate of the starting point.
+    :param start_y - float: Y coordinate of the starting point.
+    :param end_x - float: X coordinate of the ending point.
+    :param end_y - float: Y coordinate of the ending point.
+    :return: Angle in degrees (0-180), or NaN if the points coincide (closed or zero-length line).
+    """
+    return angle_from_direction(end_x - start_x, end_y - start_y)
 
 
-def calculate_angle_from_points(start, end):
+def get_line_geometries(input_line_fc, line_oids):
     """
-    Calculate the angle (bearing) between first and last points of a line geometry in degrees, accounting for bidirectional lines.
-    :param start: The geometry object of the starting point.
-    :param end: The geometry object of the ending point.
-    :return: Angle in degrees (0-360).
+    Get the geometries of the given lines in a single pass (only the requested lines are read).
+    :param input_line_fc - string: Input line feature class
+    :param line_oids - iterable of int values: OBJECTIDs of the lines
+    :return - dictionary of arcpy.Polyline: Geometries of the lines keyed by OBJECTID
     """
-    start_geom = start.getPart()
-    end_geom = end.getPart()
-    dx = end_geom.X - start_geom.X
-    dy = end_geom.Y - start_geom.Y
-    angle = math.degrees(math.atan2(dy, dx))
-    # Normalize to 0-360 degrees
-    angle = angle % 360
-    # Normalize the angle to the range 0-180 (to account for bidirectional lines)
-    if angle > 180:
-        angle -= 180
-    return angle
-
-
-def get_split_point_coords_by_split_type(input_line_fc, line_oid, split_type):
+    with arcpy.da.SearchCursor(input_line_fc, ["OBJECTID", "SHAPE@"], build_range_query("OBJECTID", line_oids)) as cursor:
+        return {row[0]: row[1] for row in cursor}
+
+
+def get_split_point_coords_by_split_type(line_geoms, line_oid, split_type):
     """
     Get the coordinates of either the midpoint of a given line or the two midpoints that break the line into thirds.
-    :param input_line_fc - string: Input line feature class
+    :param line_geoms - dictionary of arcpy.Polyline: Line geometries keyed by OBJECTID (from get_line_geometries())
     :param line_oid - int: OBJECTID of the line to process
     :param split_type - string: Type of split - one of "midpoint" or "thirds"
-    :return - list of list of float values: Coordinates of the one or two split points
+    :return - tuple of tuples of float values: Coordinates of the one or two split points
     """
-    input_line_layer = "input_line_layer"
-    arcpy.management.MakeFeatureLayer(input_line_fc, input_line_layer, f"OBJECTID = {line_oid}")
+    line_geom = line_geoms[line_oid]
     point_list = []
     if split_type == "midpoint":
-        # possible without cursor?
-        coords = []
-        with arcpy.da.SearchCursor(input_line_layer, "SHAPE@") as cursor:
-            for row in cursor:
-                coords.append(row[0].positionAlongLine(0.5,True).firstPoint.X)
-                coords.append(row[0].positionAlongLine(0.5,True).firstPoint.Y)
-                point_list.append(coords)
+        midpoint = line_geom.positionAlongLine(0.5,True).firstPoint
+        point_list.append((midpoint.X, midpoint.Y))
     elif split_type == "thirds":
-        coords_1 = []
-        coords_2 = []
-        with arcpy.da.SearchCursor(input_line_layer, "SHAPE@") as cursor:
-            for row in cursor:
-                coords_1.append(row[0].positionAlongLine(0.33,True).firstPoint.X)
-                coords_1.append(row[0].positionAlongLine(0.33,True).firstPoint.Y)
-                coords_2.append(row[0].positionAlongLine(0.66,True).firstPoint.X)
-                coords_2.append(row[0].positionAlongLine(0.66,True).firstPoint.Y)
-                point_list.append(coords_1)
-                point_list.append(coords_2)
-    return point_list
+        third_point_1 = line_geom.positionAlongLine(0.33,True).firstPoint
+        third_point_2 = line_geom.positionAlongLine(0.66,True).firstPoint
+        point_list.append((third_point_1.X, third_point_1.Y))
+        point_list.append((third_point_2.X, third_point_2.Y))
+    return tuple(point_list)
     #with arcpy.da.SearchCursor(input_fc, ["OBJECTID", "SHAPE@"]) as cursor:
     #    for row in cursor:
     #        if row[0] == line_oid:
@@ -102,7 +129,7 @@ def get_split_point_coords_by_split_type(input_line_fc, line_oid, split_type):
     #            break
 
 
-def get_points_for_splitting(input_point_fc, line_oid_lists, angle_threshold):
+def get_points_for_splitting(input_point_fc, line_oid_lists, angle_threshold, spatial_reference=None):
     """
     Create a feature class of points at which lines will be split. Use:
         - start and end points of all lines
@@ -111,6 +138,7 @@ def get_points_for_splitting(input_point_fc, line_oid_lists, angle_threshold):
     :param input_point_fc - string: Input point feature class (created from line feature class) that has a field called 'parcel_line_OID'
     :param line_oid_lists - tuple of two lists of int values: List of line OBJECTIDs with more than x vertices, List of line OBJECTIDs with less than x vertices
     :param angle_threshold - float: Threshold (in degrees) beyond which points will be used for splitting lines
+    :param spatial_reference - arcpy.SpatialReference: Spatial reference of the input (described from input_point_fc if not given)
 
     TODO - remove if unused
     :param output_point_fc - string: Output point feature class holding points at which lines will be split
@@ -119,81 +147,55 @@ def get_points_for_splitting(input_point_fc, line_oid_lists, angle_threshold):
     line_oids_with_more_points = line_oid_lists[0]
     # less_points is exactly two points
     line_oids_with_less_points = line_oid_lists[1]
-    oids_of_split_points = []
+    # a set so that the same point is never added (and queried) twice
+    oids_of_split_points = set()
     midpoints_and_thirds_coords = []
-    feature_layer = "input_points_on_two_point_line"
-    two_point_line_query = f"parcel_line_OID IN ({', '.join(map(str, line_oids_with_less_points))})"
-    arcpy.management.MakeFeatureLayer(input_point_fc, feature_layer, two_point_line_query)
+    # split type ("midpoint" or "thirds") of each line that needs midpoints or thirds, in the order the lines are handled
+    split_types_by_line = {}
+    # index the points of every line by parcel_line_OID in a single pass, ordered so that the points of each line are in sequence
+    # read coordinates only (SHAPE@XY) - full point geometries are not needed to calculate angles
+    print("Indexing points by parcel line...")
+    points_by_line = collections.defaultdict(list)
+    with arcpy.da.SearchCursor(input_point_fc, ["OBJECTID", "SHAPE@XY", "parcel_line_OID"],
+                               sql_clause=(None, 'ORDER BY parcel_line_OID, OBJECTID')) as cursor:
+        for row in cursor:
+            points_by_line[row[2]].append(row)
     # append the OBJECTIDs of the two points in each two-point line to the list of split points
     print("Getting object id's of points from two-point lines...")
-    with arcpy.da.SearchCursor(feature_layer, ["OBJECTID"]) as cursor:
-        for row in cursor:
-            oids_of_split_points.append(row[0])
+    for oid in line_oids_with_less_points:
+        oids_of_split_points.update(row[0] for row in points_by_line[oid])
     #print(f"OID's of points from two-point lines: {oids_of_split_points}")
     print("Handling lines with more than two points...")
     #print(f"Line OBJECTIDs with more than two points: {line_oids_with_more_points}")
-    for oid in line_oids_with_more_points:
-        #arcpy.management.SelectLayerByAttribute(input_point_fc, "NEW_SELECTION", f"parcel_line_OID = {oid}")
-        # should be working only with selected point features from here forward but doesn't seem to be the case
-        feature_layer = "input_points_on_single_line"
-        arcpy.management.MakeFeatureLayer(input_point_fc, feature_layer, f"parcel_line_OID = {oid}")
-        #with arcpy.da.SearchCursor(input_point_fc, ["OBJECTID", "SHAPE@"], sql_clause=(None, 'ORDER BY OBJECTID ASC')) as cursor:
-        with arcpy.da.SearchCursor(feature_layer, ["OBJECTID", "SHAPE@"], sql_clause=(None, 'ORDER BY OBJECTID ASC')) as cursor:
-            rows = list(cursor)
-            row_count = len(rows)
-            #print(f"Number of points in line with oid {oid}: {row_count}")
-            #print(f"rows: {rows}")
-            # append the OBJECTIDs of the first and last points of each line to the list of split points
-            oids_of_split_points.append(rows[0][0])
-            oids_of_split_points.append(rows[row_count - 1][0])
-            start_point_geom = rows[0][1]
-            end_point_geom = rows[row_count - 1][1]
-            previous_geom_1 = start_point_geom
-            previous_geom_2 = rows[1][1]
-            current_row = 0
-        angle_list = []
-        # same cursor has to be recreated here in order to iterate through the rows again
-        with arcpy.da.SearchCursor(feature_layer, ["OBJECTID", "SHAPE@"], sql_clause=(None, 'ORDER BY OBJECTID ASC')) as cursor:
-            for row in cursor:
-                current_row += 1
-                # skip first two points in line as we need three to calculate an angle
-                if current_row < 3:
-                    continue
-                else:
-                    oid = row[0]
-                    angle_1 = calculate_angle_from_points(previous_geom_1, previous_geom_2)
-                    angle_2 = calculate_angle_from_points(previous_geom_2, row[1])
-                    angle = abs(angle_2 - angle_1)
-                    angle_list.append(angle)
-                    #if oid - 1 in [8810, 8823]:
-                    #    print(f"OID's: {oid-2}, {oid-1}, {oid}. Angle: {angle}")
-                    #if angle > angle_threshold:
-                    if angle > angle_threshold and angle < 180 - angle_threshold:
-                        # append OID of 2nd point in the 3-point sequence
-                        oids_of_split_points.append(oid - 1)
-                        #if angle < angle_threshold + 5:
-                        #    print(f"Angle: {angle} between points with OID {oid-2}, {oid-1}, and {oid} is 5 degrees OVER threshold of {angle_threshold}.")
-                    #elif angle < angle_threshold and angle > angle_threshold - 5:
-                    #    print(f"Angle: {angle} between points with OID {oid-2}, {oid-1}, and {oid} is 5 degrees UNDER threshold of {angle_threshold}.")
-                    else:
-                        # get angle formed by the first and last points on the line
-                        start_end_angle = abs(calculate_angle_from_points(start_point_geom, end_point_geom))
-                        # TODO adjust threshold or add as a parameter
-                        if start_end_angle > 10:
-                            # TODO add line fc as a parameter to the function
-                            split_coords = get_split_point_coords_by_split_type("parcel_lines_from_polygons_TEST", oid, "midpoint")
-                        else:
-                            split_coords = get_split_point_coords_by_split_type("parcel_lines_from_polygons_TEST", oid, "thirds")
-                        for pair in split_coords:
-                            midpoints_and_thirds_coords.append(pair)
-                    previous_geom_1 = previous_geom_2
-                    previous_geom_2 = row[1]
+    lines_to_process = [oid for oid in line_oids_with_more_points if points_by_line.get(oid)]
+    # calculate the angles of all lines together before handling each line
+    split_flags_by_line = get_split_flags_by_line([[row[1] for row in points_by_line[oid]] for oid in lines_to_process], angle_threshold)
+    for oid, split_flags in zip(lines_to_process, split_flags_by_line):
+        rows = points_by_line[oid]
+        point_oids = [row[0] for row in rows]
+        xy = [row[1] for row in rows]
+        # append the OBJECTIDs of the first and last points of each line to the list of split points
+        oids_of_split_points.add(point_oids[0])
+        oids_of_split_points.add(point_oids[-1])
+        # append OIDs of the 2nd point in each 3-point sequence with an angle over the threshold
+        oids_of_split_points.update(np.asarray(point_oids)[1:-1][split_flags].tolist())
+        if not split_flags.all():
+            # get angle formed by the first and last points on the line
+            start_end_angle = abs(calculate_angle_from_points(*xy[0], *xy[-1]))
+            # TODO adjust threshold or add as a parameter
+            split_types_by_line[oid] = "midpoint" if start_end_angle > 10 else "thirds"
+
+    # read the geometries of only the lines that need midpoints or thirds, once for this call
+    # TODO add line fc as a parameter to the function
+    line_geoms = get_line_geometries("parcel_lines_from_polygons_TEST", split_types_by_line.keys())
+    for oid, split_type in split_types_by_line.items():
+        midpoints_and_thirds_coords.extend(get_split_point_coords_by_split_type(line_geoms, oid, split_type))
 
     #print(f"midpoints_and_thirds_coords: {midpoints_and_thirds_coords}")
     # combine all OID's and create a feature class
     # same as below
     #query_string = f"OBJECTID IN ({', '.join(map(str, oids_of_split_points))})"
-    query_string = f"OBJECTID IN ({', '.join(str(oid) for oid in oids_of_split_points)})"
+    query_string = build_range_query("OBJECTID", oids_of_split_points)
     print(f"length of oids_of_split_points: {len(oids_of_split_points)}")
     #arcpy.management.SelectLayerByAttribute(input_point_fc, "NEW_SELECTION", query_string)
     output_feature_layer = "output_points_for_splitting"
@@ -203,11 +205,19 @@ def get_points_for_splitting(input_point_fc, line_oid_lists, angle_threshold):
     arcpy.management.CopyFeatures(output_feature_layer, points_from_oids)
 
     # create a feature class from 'midpoint and thirds' coordinates
-    spatial_reference = arcpy.Describe(input_point_fc).spatialReference
-    #points = [arcpy.Point(*coords) for coords in midpoints_and_thirds_coords]
-    points = [arcpy.PointGeometry(arcpy.Point(*c), spatial_reference) for c in midpoints_and_thirds_coords]
+    if spatial_reference is None:
+        spatial_reference = arcpy.Describe(input_point_fc).spatialReference
     points_from_midpoints_and_thirds = f"split_points_from_midpoints_and_thirds_{angle_threshold}"
-    arcpy.management.CopyFeatures(points, points_from_midpoints_and_thirds)
+    arcpy.management.CreateFeatureclass(
+        out_path=arcpy.env.workspace,
+        out_name=points_from_midpoints_and_thirds,
+        geometry_type="POINT",
+        spatial_reference=spatial_reference
+    )
+    # write coordinates directly (SHAPE@XY) rather than building a PointGeometry for each pair
+    with arcpy.da.InsertCursor(points_from_midpoints_and_thirds, ["SHAPE@XY"]) as cursor:
+        for coords in midpoints_and_thirds_coords:
+            cursor.insertRow([coords])
 
     # combine the two output feature classes into one
     output_point_fc = f"split_points_all_angle_threshold_{angle_threshold}"
@@ -232,7 +242,7 @@ def get_points_for_splitting(input_point_fc, line_oid_lists, angle_threshold):
     #                insert_cursor.insertRow([point])
 
 
-def get_clustered_points(input_fc, line_oids, output_fc_name, cluster_vertex_min, cluster_distance_max):
+def get_clustered_points(input_fc, line_oids, output_fc_name, cluster_vertex_min, cluster_distance_max, spatial_reference=None):
     """
     Find points where more than x (cluster_vertex_min) vertices are within y (cluster_distance_max) feet of each other,
     and retain only a single representative point for each cluster.
@@ -242,9 +252,11 @@ def get_clustered_points(input_fc, line_oids, output_fc_name, cluster_vertex_min
     :param output_fc_name: Output feature class name
     :param cluster_vertex_min: Minimum number of vertices to define a cluster
     :param cluster_distance_max: Distance in feet over which a cluster is defined
+    :param spatial_reference: Spatial reference of the input (described from input_fc if not given)
     """
     print("Entered get_clustered_points()...")
-    spatial_reference = arcpy.Describe(input_fc).spatialReference
+    if spatial_reference is None:
+        spatial_reference = arcpy.Describe(input_fc).spatialReference
     out_path = os.getenv("FEATURE_DATASET", arcpy.env.workspace)
     arcpy.CreateFeatureclass_management(
         out_path=out_path,
@@ -254,45 +266,39 @@ def get_clustered_points(input_fc, line_oids, output_fc_name, cluster_vertex_min
     )
     output_fc = os.path.join(out_path, output_fc_name)
 
-    with arcpy.da.SearchCursor(input_fc, ["OBJECTID", "SHAPE@"]) as search_cursor, \
-         arcpy.da.InsertCursor(output_fc, ["SHAPE@"]):
-        for row in search_cursor:
-            if row[0] in line_oids:
-                line = row[1]
-                part = line.getPart(0)
-
-                visited = set()
-                cluster_centers = []
-
-                for i, point in enumerate(part):
-                    if i in visited:
-                        continue
-
-                    cluster = []
-                    for j, other_point in enumerate(part):
-                        if i != j and j not in visited:
-                            distance = ((point.X - other_point.X)**2 + (point.Y - other_point.Y)**2)**0.5
-                            if distance <= cluster_distance_max:
-                                cluster.append((j, other_point))
-
-                    if len(cluster) >= cluster_vertex_min:
-                        # Calculate cluster center
-                        x_coords = [point.X] + [p.X for _, p in cluster]
-                        y_coords = [point.Y] + [p.Y for _, p in cluster]
-                        cluster_center = arcpy.Point(
-                            X=sum(x_coords) / len(x_coords),
-                            Y=sum(y_coords) / len(y_coords)
-                        )
-                        cluster_centers.append(cluster_center)
-                        visited.update([j for j, _ in cluster])
-                        visited.add(i)
-
-                # Insert a single representative point for each cluster
-                for cluster_center in cluster_centers:
-                    arcpy.da.InsertCursor(output_fc, ["SHAPE@"]).insertRow([cluster_center])
-                    
-
-def get_clustered_points_OLD(input_fc, line_oids, output_fc_name, cluster_vertex_min, cluster_distance_max):
+    line_query = build_range_query("OBJECTID", line_oids)
+    # explode_to_points returns one row per vertex so only coordinates (SHAPE@XY) need to be read
+    with arcpy.da.SearchCursor(input_fc, ["OBJECTID", "SHAPE@XY"], line_query, explode_to_points=True) as search_cursor, \
+         arcpy.da.InsertCursor(output_fc, ["SHAPE@XY"]) as insert_cursor:
+        for _, rows in itertools.groupby(search_cursor, key=lambda row: row[0]):
+            xy = np.asarray([row[1] for row in rows])
+
+            # visited[j] is True once point j has been assigned to a cluster
+            visited = np.zeros(len(xy), dtype=bool)
+            cluster_centers = []
+
+            for i in range(len(xy)):
+                if visited[i]:
+                    continue
+
+                # unvisited points (other than point i) within cluster_distance_max of point i
+                distances = np.hypot(xy[:, 0] - xy[i, 0], xy[:, 1] - xy[i, 1])
+                cluster = (distances <= cluster_distance_max) & ~visited
+                cluster[i] = False
+
+                if np.count_nonzero(cluster) >= cluster_vertex_min:
+                    # Calculate cluster center
+                    cluster[i] = True
+                    cluster_center = tuple(xy[cluster].mean(axis=0))
+                    cluster_centers.append(cluster_center)
+                    visited |= cluster
+
+            # Insert a single representative point for each cluster
+            for cluster_center in cluster_centers:
+                insert_cursor.insertRow([cluster_center])
+
+
+def get_clustered_points_OLD(input_fc, line_oids, output_fc_name, cluster_vertex_min, cluster_distance_max, spatial_reference=None):
     """
     Find points where more than x (cluster_vertex_min) vertices are within y (cluster_distance_max) feet of each other.
     :param input_fc - string: Input feature class
@@ -300,9 +306,11 @@ def get_clustered_points_OLD(input_fc, line_oids, output_fc_name, cluster_vertex
     :param output_fc_name - string: Output feature class name
     :param cluster_vertex_min - int: minimum number of vertices to define a cluster
     :param cluster_distance_max - float: distance in feet over which a cluster is defined
+    :param spatial_reference - arcpy.SpatialReference: Spatial reference of the input (described from input_fc if not given)
     """
     print("Entered get_clustered_points()...")
-    spatial_reference = arcpy.Describe(input_fc).spatialReference
+    if spatial_reference is None:
+        spatial_reference = arcpy.Describe(input_fc).spatialReference
     out_path = os.getenv("FEATURE_DATASET")
     arcpy.CreateFeatureclass_management(
         out_path=out_path,
@@ -311,24 +319,23 @@ def get_clustered_points_OLD(input_fc, line_oids, output_fc_name, cluster_vertex
         spatial_reference=spatial_reference
     )
     output_fc = os.path.join(out_path, output_fc_name)
-    with arcpy.da.SearchCursor(input_fc, ["OBJECTID", "SHAPE@"]) as search_cursor, \
-         arcpy.da.InsertCursor(output_fc, ["SHAPE@"]) as insert_cursor:
-        for row in search_cursor:
-            if row[0] in line_oids:
-                line = row[1]
-                part = line.getPart(0)
-                for i, point in enumerate(part):
-                    nearby_count = 0
-                    for j, other_point in enumerate(part):
-                        if i != j:
-                            distance = ((point.X - other_point.X)**2 + (point.Y - other_point.Y)**2)**0.5
-                            if distance <= cluster_distance_max:
-                                nearby_count += 1
-                    if nearby_count >= cluster_vertex_min:
-                        insert_cursor.insertRow([point])
-
-
-def get_midpoints_and_clusters(input_fc, line_oids, output_fc_name, cluster_vertex_min, cluster_distance_max):
+    line_query = build_range_query("OBJECTID", line_oids)
+    with arcpy.da.SearchCursor(input_fc, ["OBJECTID", "SHAPE@XY"], line_query, explode_to_points=True) as search_cursor, \
+         arcpy.da.InsertCursor(output_fc, ["SHAPE@XY"]) as insert_cursor:
+        for _, rows in itertools.groupby(search_cursor, key=lambda row: row[0]):
+            part = [row[1] for row in rows]
+            for i, point in enumerate(part):
+                nearby_count = 0
+                for j, other_point in enumerate(part):
+                    if i != j:
+                        distance = ((point[0] - other_point[0])**2 + (point[1] - other_point[1])**2)**0.5
+                        if distance <= cluster_distance_max:
+                            nearby_count += 1
+                if nearby_count >= cluster_vertex_min:
+                    insert_cursor.insertRow([point])
+
+
+def get_midpoints_and_clusters(input_fc, line_oids, output_fc_name, cluster_vertex_min, cluster_distance_max, spatial_reference=None):
     """
     Find midpoints and points where more than x (cluster_vertex_min) vertices are within y (cluster_distance_max) feet of each other.
     :param input_fc - string: Input feature class
@@ -336,9 +343,11 @@ def get_midpoints_and_clusters(input_fc, line_oids, output_fc_name, cluster_vert
     :param output_fc_name - string: Output feature class name
     :param cluster_vertex_min - int: minimum number of vertices to define a cluster
     :param cluster_distance_max - float: distance in feet over which a cluster is defined
+    :param spatial_reference - arcpy.SpatialReference: Spatial reference of the input (described from input_fc if not given)
     """
     print("Entered get_midpoints_and_clusters()...")
-    spatial_reference = arcpy.Describe(input_fc).spatialReference
+    if spatial_reference is None:
+        spatial_reference = arcpy.Describe(input_fc).spatialReference
     out_path = os.getenv("FEATURE_DATASET")
     arcpy.CreateFeatureclass_management(
         out_path=out_path,
@@ -348,36 +357,35 @@ def get_midpoints_and_clusters(input_fc, line_oids, output_fc_name, cluster_vert
     )
     output_fc = os.path.join(out_path, output_fc_name)
 
-    with arcpy.da.SearchCursor(input_fc, ["OBJECTID", "SHAPE@"]) as search_cursor, \
-         arcpy.da.InsertCursor(output_fc, ["SHAPE@"]) as insert_cursor:
-        for row in search_cursor:
-            if row[0] in line_oids:
-                line = row[1]
-                part = line.getPart(0)
-
-                # Calculate midpoint
-                if len(part) > cluster_vertex_min:
-                    midpoint_index = len(part) // 2
-                    midpoint = part[midpoint_index]
-                    insert_cursor.insertRow([midpoint])
-
-                # Identify clusters and retain one point per cluster
-                visited = set()
-                for i, point in enumerate(part):
-                    if i in visited:
-                        continue
-
-                    cluster_points = []
-                    for j, other_point in enumerate(part):
-                        if i != j and j not in visited:
-                            distance = ((point.X - other_point.X)**2 + (point.Y - other_point.Y)**2)**0.5
-                            if distance <= cluster_distance_max:
-                                cluster_points.append((j, other_point))
-
-                    if len(cluster_points) >= cluster_vertex_min:
-                        insert_cursor.insertRow([point])
-                        visited.update([idx for idx, _ in cluster_points])
-                        visited.add(i)
+    line_query = build_range_query("OBJECTID", line_oids)
+    with arcpy.da.SearchCursor(input_fc, ["OBJECTID", "SHAPE@XY"], line_query, explode_to_points=True) as search_cursor, \
+         arcpy.da.InsertCursor(output_fc, ["SHAPE@XY"]) as insert_cursor:
+        for _, rows in itertools.groupby(search_cursor, key=lambda row: row[0]):
+            part = [row[1] for row in rows]
+
+            # Calculate midpoint
+            if len(part) > cluster_vertex_min:
+                midpoint_index = len(part) // 2
+                midpoint = part[midpoint_index]
+                insert_cursor.insertRow([midpoint])
+
+            # Identify clusters and retain one point per cluster
+            xy = np.asarray(part)
+            # visited[j] is True once point j has been assigned to a cluster
+            visited = np.zeros(len(xy), dtype=bool)
+            for i, point in enumerate(part):
+                if visited[i]:
+                    continue
+
+                # unvisited points (other than point i) within cluster_distance_max of point i
+                distances = np.hypot(xy[:, 0] - point[0], xy[:, 1] - point[1])
+                cluster_points = (distances <= cluster_distance_max) & ~visited
+                cluster_points[i] = False
+
+                if np.count_nonzero(cluster_points) >= cluster_vertex_min:
+                    insert_cursor.insertRow([point])
+                    visited |= cluster_points
+                    visited[i] = True
 
 
 def split_lines(input_fc, points_fc, output_fc, search_radius=250):
@@ -412,6 +420,8 @@ def run(min_vertices=2):
 
     feature_dataset = os.getenv("FEATURE_DATASET")
     input_fc = os.path.join(feature_dataset, input_line_fc_name)
+    # lines and the points created from them share a spatial reference - describe it once for the whole run
+    spatial_reference = arcpy.Describe(input_fc).spatialReference
     #output_midpoints_fc_name = "midpoints_and_corners_20250128"
     output_midpoints_fc_name = "cluster_centers_20250204"
     output_midpoints_fc = os.path.join(feature_dataset, output_midpoints_fc_name)
@@ -433,9 +443,9 @@ def run(min_vertices=2):
     # Step 3: Calculate and save midpoints and corners
     #get_midpoints_and_clusters(input_fc, line_oids, output_midpoints_fc_name, 7, 40)
     #get_clustered_points(input_fc, line_oids, output_midpoints_fc_name, 6, 50)
-    get_clustered_points(input_fc, line_oid_lists[0], output_midpoints_fc_name, 9, 25)
+    get_clustered_points(input_fc, line_oid_lists[0], output_midpoints_fc_name, 9, 25, spatial_reference)
 
-    #get_points_for_splitting(input_point_fc_name, line_oid_lists, 30)
+    #get_points_for_splitting(input_point_fc_name, line_oid_lists, 30, spatial_reference)
 
     # Step 4: Split lines at midpoints
     #split_lines(input_fc, output_midpoints_fc, output_split_lines_fc, 250)
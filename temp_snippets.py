@@ -5,6 +5,7 @@ import time
 import pandas as pd
 import numpy as np
 from shared import set_environment
+from near_tables import build_side_info_array
 
 
 def calculate_angle(geometry):
@@ -33,44 +34,18 @@ def transform_near_table_with_street_info(gdb_path, near_table_name, parcel_stre
 
     # Load the near table
     near_table_path = os.path.join(gdb_path, near_table_name)
-    near_array = arcpy.da.TableToNumPyArray(near_table_path, "*")
+    # only the fields used below - not every field in the near table
+    near_array = arcpy.da.TableToNumPyArray(near_table_path, ["IN_FID", "NEAR_FID", "NEAR_DIST"])
     near_df = pd.DataFrame(near_array)
 
     # Merge near table with join results
     merged_df = near_df.merge(join_df, left_on="NEAR_FID", right_on="PB_FID", how="left")
     merged_df["is_facing_street"] = (merged_df["STREET_NAME"].notna()) & (merged_df["is_parallel_to_street"] == "Yes")
 
-    # Populate fields for facing streets and other sides
-    output_data = []
-    for in_fid, group in merged_df.groupby("IN_FID"):
-        row = {"IN_FID": in_fid}
-        facing_count, other_count = 1, 1
-
-        for _, record in group.iterrows():
-            near_fid = record["NEAR_FID"]
-            distance = record["NEAR_DIST"]
-
-            if record["is_facing_street"]:
-                if facing_count <= 4:
-                    row[f"FACING_STREET_{facing_count}"] = record["STREET_NAME"]
-                    row[f"FACING_STREET_{facing_count}_PB_FID"] = near_fid
-                    row[f"FACING_STREET_{facing_count}_DIST_FT"] = distance
-                    facing_count += 1
-            else:
-                if other_count <= 4:
-                    row[f"OTHER_SIDE_{other_count}_PB_FID"] = near_fid
-                    row[f"OTHER_SIDE_{other_count}_DIST_FT"] = distance
-                    other_count += 1
-
-        output_data.append(row)
-
-    output_df = pd.DataFrame(output_data)
-    output_df.fillna(-1, inplace=True)
-
-    output_array = np.array(
-        [tuple(row) for row in output_df.to_records(index=False)],
-        dtype=[(col, "f8" if "DIST" in col else "<U50") for col in output_df.columns]
-    )
+    # Populate fields for facing streets and other sides (first 4 of each per building side, numbered with
+    # groupby().cumcount() and written straight into a preallocated structured array)
+    street_name_length = arcpy.ListFields(parcel_street_join, "StFULLName")[0].length
+    output_array = build_side_info_array(merged_df, max_count=4, street_name_length=street_name_length)
 
     transformed_table_path = os.path.join(gdb_path, "transformed_near_table_with_street_info")
     if arcpy.Exists(transformed_table_path):
@@ -113,8 +88,14 @@ def process_parcel(parcel_id, all_parcel_polygons_fc, building_fc, initial_near_
         arcpy.management.AddField(initial_near_table, f"OTHER_SIDE_{i}_PB_FID", "LONG")
         arcpy.management.AddField(initial_near_table, f"OTHER_SIDE_{i}_DIST_FT", "FLOAT")
 
-    arcpy.management.AddField(initial_near_table, "PARCEL_COMBO_FID", "TEXT")
-    arcpy.management.CalculateField(initial_near_table, "PARCEL_COMBO_FID", f"'{parcel_id}-' + str(!NEAR_FID!)", "PYTHON3")
+    # Build PARCEL_COMBO_FID with one vectorized string operation and append it with ExtendTable
+    oid_field = arcpy.Describe(initial_near_table).OIDFieldName
+    ids = arcpy.da.TableToNumPyArray(initial_near_table, [oid_field, "NEAR_FID"])
+    if len(ids):
+        combo_array = np.empty(len(ids), dtype=[("NEAR_OID", "i4"), ("PARCEL_COMBO_FID", "<U50")])
+        combo_array["NEAR_OID"] = ids[oid_field]
+        combo_array["PARCEL_COMBO_FID"] = np.char.add(f"{parcel_id}-", ids["NEAR_FID"].astype(str))
+        arcpy.da.ExtendTable(initial_near_table, oid_field, combo_array, "NEAR_OID")
 
 
 # Run function to tie everything together
@@ -133,14 +114,12 @@ def run(building_source_date, parcel_id, all_parcel_lines_fc):
 def calculate_angle_from_points(start, end):
     """
     Calculate the angle (bearing) between first and last points of a line geometry in degrees, accounting for bidirectional lines.
-    :param start: The geometry object of the starting point.
-    :param end: The geometry object of the ending point.
+    :param start: (X, Y) coordinates of the starting point (as read with SHAPE@XY).
+    :param end: (X, Y) coordinates of the ending point (as read with SHAPE@XY).
     :return: Angle in degrees (0-360).
     """
-    start_geom = start.getPart()
-    end_geom = end.getPart()
-    dx = end_geom.X - start_geom.X
-    dy = end_geom.Y - start_geom.Y
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
     angle = math.degrees(math.atan2(dy, dx))
     # Normalize to 0-360 degrees
     angle = angle % 360
@@ -149,36 +128,21 @@ def calculate_angle_from_points(start, end):
         angle -= 180
     return angle
 
+# read the coordinates once and calculate the angles of all consecutive point pairs at once (same normalization as
+# calculate_angle_from_points())
+point_array = arcpy.da.FeatureClassToNumPyArray("points_from_parcel_lines_from_polygons_TEST", ["OBJECTID", "SHAPE@X", "SHAPE@Y"], "OBJECTID < 7")
+point_array = point_array[np.argsort(point_array["OBJECTID"])]
+point_oids = point_array["OBJECTID"].tolist()
+pair_angles = np.degrees(np.arctan2(np.diff(point_array["SHAPE@Y"]), np.diff(point_array["SHAPE@X"]))) % 360
+pair_angles = np.where(pair_angles > 180, pair_angles - 180, pair_angles)
+
 # using a single previous point and current point
-with arcpy.da.SearchCursor("points_from_parcel_lines_from_polygons_TEST", ["OBJECTID", "SHAPE@"]) as cursor:
-    previous_geom = None
-    for row in cursor:
-        if row[0] == 1:
-            previous_geom = row[1]
-        elif row[0] < 7:
-            if previous_geom:
-                oid = row[0]
-                angle = calculate_angle_from_points(previous_geom, row[1])
-                print(f"Angle between point with OID {oid-1} and that with {oid}: {angle}")
-                previous_geom = row[1]
+for oid_1, oid_2, angle in zip(point_oids, point_oids[1:], pair_angles.tolist()):
+    print(f"Angle between point with OID {oid_1} and that with {oid_2}: {angle}")
 
 # using two previous points and current point
-with arcpy.da.SearchCursor("points_from_parcel_lines_from_polygons_TEST", ["OBJECTID", "SHAPE@"]) as cursor:
-    previous_geom_1 = None
-    previous_geom_2 = None
-    for row in cursor:
-        if row[0] == 1:
-            previous_geom_1 = row[1]
-        elif row[0] == 2:
-            previous_geom_2 = row[1]
-        elif row[0] < 7:
-            oid = row[0]
-            angle_1 = calculate_angle_from_points(previous_geom_1, previous_geom_2)
-            angle_2 = calculate_angle_from_points(previous_geom_2, row[1])
-            angle = angle_2 - angle_1
-            print(f"OID's: {oid-2}, {oid-1}, {oid}. Angle: {angle}")
-            previous_geom_1 = previous_geom_2
-            previous_geom_2 = row[1]    
+for oid_1, oid_2, oid_3, angle in zip(point_oids, point_oids[1:], point_oids[2:], np.diff(pair_angles).tolist()):
+    print(f"OID's: {oid_1}, {oid_2}, {oid_3}. Angle: {angle}")
 
 
 
@@ -188,10 +152,9 @@ spatial_reference = arcpy.Describe("parcel_lines_from_polygons_TEST").spatialRef
 point_list = []
 with arcpy.da.SearchCursor("parcel_lines_from_polygons_TEST", ["SHAPE@"]) as cursor:
     for row in cursor:
-        coords = []
-        coords.append(row[0].positionAlongLine(0.5,True).firstPoint.X)
-        coords.append(row[0].positionAlongLine(0.5,True).firstPoint.Y)
-        point_list.append(coords)
+        # call positionAlongLine once per line and read both coordinates from the result
+        midpoint = row[0].positionAlongLine(0.5,True).firstPoint
+        point_list.append([midpoint.X, midpoint.Y])
 point_list
 [[2430329.0269888253, 7065293.877205671], [2430446.8901319727, 7065241.751775163], [2430515.0806996343, 7065314.388608029]]
 points = [arcpy.PointGeometry(arcpy.Point(*c), spatial_reference) for c in point_list]
@@ -199,10 +162,10 @@ arcpy.management.CopyFeatures(points, "test2_points_from_coords")
 #<Result 'C:\\ArcGIS\\Projects\\setback_measurement_2276\\setback_measurement_2276.gdb\\test2_points_from_coords'>
 
 
-# true centroid test
-with arcpy.da.SearchCursor("parcel_lines_from_polygons_TEST", ["OBJECTID", "SHAPE@"]) as cursor:
+# true centroid test (SHAPE@XY is the centroid - no need to read full geometries)
+with arcpy.da.SearchCursor("parcel_lines_from_polygons_TEST", ["OBJECTID", "SHAPE@XY", "SHAPE@TRUECENTROID"]) as cursor:
     for row in cursor:
-        print(f"OID: {row[0]}, X of centroid: {row[1].centroid.X}, X of true centroid: {row[1].trueCentroid.X}")
+        print(f"OID: {row[0]}, X of centroid: {row[1][0]}, X of true centroid: {row[2][0]}")
 #OID: 331, X of centroid: 2429063.533212676, X of true centroid: 2429064.295714088 (U-shaped (upside down) with rounded corners)
 #OID: 1955, X of centroid: 2430329.195365561, X of true centroid: 2430353.3099913066 (corner lot with one curve)
 #OID: 1959, X of centroid: 2430560.5866131866, X of true centroid: 2430574.7136286166 (corner lot with one curve)
@@ -0,0 +1,86 @@
+import os
+import sys
+import math
+import unittest
+import numpy as np
+
+# the scripts are run from the repository root rather than installed, so make the modules there importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from angles import angles_from_directions, angle_from_direction, is_parallel_vec, get_split_flags, get_split_flags_by_line
+
+
+class TestAngles(unittest.TestCase):
+
+    def test_negative_dx_and_dy_are_normalized_to_0_180(self):
+        # a line pointing down and to the left has the same bearing as one pointing up and to the right
+        self.assertAlmostEqual(float(angles_from_directions(-1.0, -1.0)), 45.0)
+        self.assertAlmostEqual(angle_from_direction(-1.0, -1.0), 45.0)
+        self.assertAlmostEqual(angle_from_direction(-3.0, -1.0), angle_from_direction(3.0, 1.0))
+
+    def test_0_and_180_wrap_to_0(self):
+        angles = angles_from_directions(np.array([1.0, -1.0, 1.0]), np.array([0.0, 0.0, -1e-12]))
+        self.assertAlmostEqual(angles[0], 0.0)
+        self.assertAlmostEqual(angles[1], 0.0)
+        # just below the x axis is just below 180 rather than a small negative angle
+        self.assertTrue(179.0 < angles[2] < 180.0)
+        self.assertAlmostEqual(angle_from_direction(-1.0, 0.0), 0.0)
+
+    def test_zero_length_direction_is_nan(self):
+        self.assertTrue(np.isnan(angles_from_directions(np.array([0.0]), np.array([0.0])))[0])
+        self.assertTrue(math.isnan(angle_from_direction(0.0, 0.0)))
+
+    def test_array_and_scalar_versions_agree(self):
+        dx = np.array([1.0, -2.0, 0.5, -0.3, 0.0])
+        dy = np.array([2.0, -1.0, -4.0, 0.7, 3.0])
+        expected = [angle_from_direction(x, y) for x, y in zip(dx, dy)]
+        np.testing.assert_allclose(angles_from_directions(dx, dy), expected)
+
+    def test_is_parallel_vec_across_0_180(self):
+        # bearings of 2 and 179 degrees differ by only 3 degrees once direction is ignored
+        dx1, dy1 = math.cos(math.radians(2)), math.sin(math.radians(2))
+        dx2, dy2 = math.cos(math.radians(179)), math.sin(math.radians(179))
+        self.assertTrue(is_parallel_vec(dx1, dy1, dx2, dy2, tolerance=10))
+        self.assertFalse(is_parallel_vec(1.0, 0.0, 0.0, 1.0, tolerance=10))
+
+    def test_is_parallel_vec_zero_length_is_not_parallel(self):
+        self.assertFalse(is_parallel_vec(0.0, 0.0, 1.0, 0.0))
+        self.assertFalse(is_parallel_vec(1.0, 0.0, 0.0, 0.0))
+
+
+
+class TestSplitFlags(unittest.TestCase):
+
+    def test_corner_is_flagged_and_straight_line_is_not(self):
+        np.testing.assert_array_equal(get_split_flags([(0, 0), (1, 0), (1, 1)], 30), [True])
+        np.testing.assert_array_equal(get_split_flags([(0, 0), (1, 0), (2, 0)], 30), [False])
+
+    def test_bearings_either_side_of_0_180_are_not_flagged(self):
+        # 1 degree above and 1 degree below the x axis - bearings 1 and 179, which differ by 2 degrees as lines
+        xy = [(0, 0), (math.cos(math.radians(1)), math.sin(math.radians(1))), (2 * math.cos(math.radians(1)), 0)]
+        np.testing.assert_array_equal(get_split_flags(xy, 30), [False])
+
+    def test_repeated_vertex_is_not_flagged(self):
+        np.testing.assert_array_equal(get_split_flags([(0, 0), (1, 0), (1, 0), (2, 0)], 30), [False, False])
+
+    def test_flags_by_line_match_flags_of_each_line(self):
+        xy_by_line = [
+            [(0, 0), (1, 0), (2, 0)],
+            [(5, 5), (6, 5), (6, 6)],
+            [(9, 9), (10, 10)],
+            [(0, 0), (1, 0), (2, 0), (2, 1)],
+            [(3, 3), (4, 4), (5, 3), (6, 4), (7, 3)],
+        ]
+        flags_by_line = get_split_flags_by_line(xy_by_line, 30)
+        self.assertEqual(len(flags_by_line), len(xy_by_line))
+        for xy, flags in zip(xy_by_line, flags_by_line):
+            self.assertEqual(len(flags), len(xy) - 2)
+            np.testing.assert_array_equal(flags, get_split_flags(xy, 30))
+        np.testing.assert_array_equal(flags_by_line[3], [False, True])
+
+    def test_flags_by_line_with_no_lines(self):
+        self.assertEqual(get_split_flags_by_line([], 30), [])
+
+
+if __name__ == "__main__":
+    unittest.main()